@@ -3,7 +3,10 @@ from chessboard.board import Board
 from chessboard.players import *
 from chessboard.piece import Piece
 from chessboard.pieces import Pieces
-from chessboard.move import Move
+from chessboard.bitboard import BitBoard
+from chessboard.position import Position
+from chessboard.movegen import generate_legal_moves
+from chessboard import zobrist, boardbuffer, move, cache, transposition, polyglot
 from chessboard.rook import Rook
 from chessboard.knight import Knight
 from chessboard.bishop import Bishop
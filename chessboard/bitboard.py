@@ -0,0 +1,189 @@
+"""
+Bitboard representation of the piece positions. Bit n of each mask corresponds
+to the board positional index n (a8 is bit 0, h1 is bit 63)
+"""
+
+from settings import ALLEGIANCES, NOTATION, OPPOSING_ALLEGIANCE
+from chessboard.tables import (ROOK_DIRECTIONS, BISHOP_DIRECTIONS, RAY_MASKS, KNIGHT_ATTACKS,
+                               KING_ATTACKS, PAWN_ATTACKS, PAWN_HOME_RANK_MASK)
+
+PIECE_NAMES = list(NOTATION.values())
+
+
+def squares(mask):
+    """Return the positional indexes of the set bits of a mask in ascending order"""
+    indexes = []
+    while mask:
+        low = mask & -mask
+        indexes.append(low.bit_length() - 1)
+        mask ^= low
+    return indexes
+
+
+def _sliding_attacks(idx, occupied, directions):
+    """Return the attack mask of a sliding piece given the board occupancy"""
+    attacks = 0
+    for direction in directions:
+        ray = RAY_MASKS[direction][idx]
+        blockers = ray & occupied
+        if blockers:
+            if direction > 0:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= RAY_MASKS[direction][blocker]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(idx, occupied):
+    """Return the squares attacked by a rook on idx"""
+    return _sliding_attacks(idx, occupied, ROOK_DIRECTIONS)
+
+
+def bishop_attacks(idx, occupied):
+    """Return the squares attacked by a bishop on idx"""
+    return _sliding_attacks(idx, occupied, BISHOP_DIRECTIONS)
+
+
+def queen_attacks(idx, occupied):
+    """Return the squares attacked by a queen on idx"""
+    return (_sliding_attacks(idx, occupied, ROOK_DIRECTIONS) |
+            _sliding_attacks(idx, occupied, BISHOP_DIRECTIONS))
+
+
+class BitBoard():
+    """One 64 bit integer per piece type and allegiance plus occupancy masks"""
+
+    def __init__(self):
+        self.pieces = {}
+        self.occupied = {}
+        self.reset()
+
+    def __repr__(self):
+        return "<%s(%d pieces)>" % (self.__class__.__name__, bin(self.occupancy()).count('1'))
+
+    def reset(self):
+        """Empty all the masks"""
+        self.pieces = {allegiance: {name: 0 for name in PIECE_NAMES}
+                       for allegiance in ALLEGIANCES}
+        self.occupied = {allegiance: 0 for allegiance in ALLEGIANCES}
+
+    def load(self, positions):
+        """Rebuild the masks from a list of 64 board positions"""
+        self.reset()
+        for idx, piece in enumerate(positions):
+            if piece is not None:
+                self.add(idx, str(piece), piece.allegiance)
+
+    def add(self, idx, name, allegiance):
+        """Place a piece on the square idx"""
+        bit = 1 << idx
+        self.pieces[allegiance][name] |= bit
+        self.occupied[allegiance] |= bit
+
+    def remove(self, idx, name, allegiance):
+        """Remove a piece from the square idx"""
+        bit = ~(1 << idx)
+        self.pieces[allegiance][name] &= bit
+        self.occupied[allegiance] &= bit
+
+    def occupancy(self):
+        """Return the mask of all occupied squares"""
+        return self.occupied['white'] | self.occupied['black']
+
+    def piece_at(self, idx):
+        """Return the (name, allegiance) of the piece on idx or None"""
+        bit = 1 << idx
+        for allegiance, masks in self.pieces.items():
+            if self.occupied[allegiance] & bit:
+                for name, mask in masks.items():
+                    if mask & bit:
+                        return name, allegiance
+        return None
+
+    def iter_pieces(self):
+        """Yield (idx, name, allegiance) for every piece on the board"""
+        for allegiance, masks in self.pieces.items():
+            for name, mask in masks.items():
+                for idx in squares(mask):
+                    yield idx, name, allegiance
+
+    def attacks(self, idx, name, allegiance, occupied=None):
+        """
+        Return the attack mask of a piece of the given name and allegiance on
+        idx. Sliding attacks stop at the first occupied square
+        """
+        if name == 'pawn':
+            return PAWN_ATTACKS[allegiance][idx]
+        if name == 'knight':
+            return KNIGHT_ATTACKS[idx]
+        if name == 'king':
+            return KING_ATTACKS[idx]
+        if occupied is None:
+            occupied = self.occupancy()
+        if name == 'rook':
+            return rook_attacks(idx, occupied)
+        if name == 'bishop':
+            return bishop_attacks(idx, occupied)
+        return queen_attacks(idx, occupied)
+
+    def pawn_pushes(self, idx, allegiance):
+        """Return the mask of the single and double pawn pushes from idx"""
+        occupied = self.occupancy()
+        step = 8 if allegiance == 'black' else -8
+        target = idx + step
+        if not 0 <= target < 64 or occupied & (1 << target):
+            return 0
+        pushes = 1 << target
+        if PAWN_HOME_RANK_MASK[allegiance] & (1 << idx):
+            target += step
+            if not occupied & (1 << target):
+                pushes |= 1 << target
+        return pushes
+
+    def attacked_squares(self, allegiance, occupied=None):
+        """Return the mask of every square attacked by the given allegiance"""
+        if occupied is None:
+            occupied = self.occupancy()
+        masks = self.pieces[allegiance]
+        attacked = 0
+        for idx in squares(masks['pawn']):
+            attacked |= PAWN_ATTACKS[allegiance][idx]
+        for idx in squares(masks['knight']):
+            attacked |= KNIGHT_ATTACKS[idx]
+        for idx in squares(masks['king']):
+            attacked |= KING_ATTACKS[idx]
+        for idx in squares(masks['rook'] | masks['queen']):
+            attacked |= rook_attacks(idx, occupied)
+        for idx in squares(masks['bishop'] | masks['queen']):
+            attacked |= bishop_attacks(idx, occupied)
+        return attacked
+
+    def attackers(self, idx, allegiance, occupied=None):
+        """Return the mask of the pieces of the given allegiance attacking idx"""
+        if occupied is None:
+            occupied = self.occupancy()
+        masks = self.pieces[allegiance]
+        return ((PAWN_ATTACKS[OPPOSING_ALLEGIANCE[allegiance]][idx] & masks['pawn']) |
+                (KNIGHT_ATTACKS[idx] & masks['knight']) |
+                (KING_ATTACKS[idx] & masks['king']) |
+                (rook_attacks(idx, occupied) & (masks['rook'] | masks['queen'])) |
+                (bishop_attacks(idx, occupied) & (masks['bishop'] | masks['queen'])))
+
+    def is_attacked(self, idx, allegiance, occupied=None):
+        """
+        Return True if a piece of the given allegiance attacks idx. The cheap
+        table lookups are tried before the sliding rays and the first hit returns
+        """
+        masks = self.pieces[allegiance]
+        if (PAWN_ATTACKS[OPPOSING_ALLEGIANCE[allegiance]][idx] & masks['pawn'] or
+                KNIGHT_ATTACKS[idx] & masks['knight'] or KING_ATTACKS[idx] & masks['king']):
+            return True
+        if occupied is None:
+            occupied = self.occupancy()
+        rooks = masks['rook'] | masks['queen']
+        if rooks and rook_attacks(idx, occupied) & rooks:
+            return True
+        bishops = masks['bishop'] | masks['queen']
+        return bool(bishops and bishop_attacks(idx, occupied) & bishops)
@@ -4,46 +4,174 @@ Module containing the 'Board' which consists of the piece positions and piece st
 # pylint: disable=no-value-for-parameter
 # pylint: disable=import-outside-toplevel
 import re
+from array import array
 import utils
 from fen import FENParser, FENBuilder
-from settings import FEN_START_STATE, UNICODE_PIECES, FILE_NUMBERS, NOTATION, ALLEGIANCES
+from settings import (FEN_START_STATE, UNICODE_PIECES, FILE_NUMBERS, NOTATION, ALLEGIANCES,
+                      OPPOSING_ALLEGIANCE, CASTLING_POSITIONS, CASTLING_RIGHTS, MAX_RANK)
 from chessboard.players import Players, Human, Computer
 from chessboard.pieces import Pieces
-from chessboard.move import Move
+from chessboard.bitboard import BitBoard, squares
+from chessboard.movegen import generate_legal_moves, STAGES, ALL_SQUARES
+from chessboard.position import Position
+from chessboard.move import (encode_move, decode_move, move_to_uci, move_start,
+                             move_end, FLAG_NORMAL, FLAG_ENPASSANT, FLAG_CASTLING)
+from chessboard import zobrist, boardbuffer
+from chessboard.see import see
+from chessboard.cache import LegalMoveCache
+from chessboard.tables import LIGHT_SQUARES
 
 DECODE_PLAYER = {'h': Human, 'human': Human, 'c': Computer, 'computer': Computer}
 
+# Castling mask bit of each (allegiance, side) right, all rights held is 0xf
+CASTLING_BITS = {right: 1 << bit for bit, right in enumerate(CASTLING_RIGHTS)}
+
+
+def _build_castling_rights_masks():
+    """
+    Return the castling rights kept by a move from or to each square. Moving the
+    king or a rook from home, or capturing a rook at home, loses the right
+    """
+    masks = [0xf]*64
+    for (allegiance, side), bit in CASTLING_BITS.items():
+        masks[CASTLING_POSITIONS[allegiance]['king_home_square']] &= ~bit
+        masks[CASTLING_POSITIONS[allegiance]['%s_side_rook_pos' % side]] &= ~bit
+    return masks
+
+
+CASTLING_RIGHTS_MASKS = _build_castling_rights_masks()
+
+# Pieces a pawn can promote to, in the order they are generated
+PROMOTION_CHOICES = ['q', 'r', 'b', 'n']
+
+# Pawns promote on reaching these board rows
+PROMOTION_ROW = {allegiance: 8 - MAX_RANK[allegiance] for allegiance in ALLEGIANCES}
+
+# Standard algebraic notation of a move other than castling. Groups are the
+# piece, file and rank disambiguation, end square and promotion piece
+SAN_PATTERN = re.compile(r'([NBRQK])?([a-h])?([1-8])?[x:]?([a-h][1-8])'
+                         r'(?:[=/]?\(?([NBRQnbrq])\)?)?[+#†]?')
+
+# Positional indexes by algebraic expression for parsing UCI moves
+UCI_SQUARES = {utils.idx_to_algebra(idx): idx for idx in range(64)}
+
+SAN_CASTLING_SIDES = {'O-O': 'king', '0-0': 'king', 'O-O-O': 'queen', '0-0-0': 'queen'}
+
+
+class UndoEntry():
+    """
+    What push() records to undo a move: the moved, captured, promoted and
+    castling rook pieces with their squares and the state the move replaced
+    """
+
+    __slots__ = ('move', 'piece', 'captured', 'captured_idx', 'promotion_piece', 'rook',
+                 'rook_start', 'rook_end', 'castling', 'enpassant_sq', 'halfmove_clk',
+                 'fullmove_num')
+
+    def __init__(self, move, piece, captured, captured_idx, promotion_piece, rook,
+                 rook_start, rook_end, castling, enpassant_sq, halfmove_clk, fullmove_num):
+        self.move = move
+        self.piece = piece
+        self.captured = captured
+        self.captured_idx = captured_idx
+        self.promotion_piece = promotion_piece
+        self.rook = rook
+        self.rook_start = rook_start
+        self.rook_end = rook_end
+        self.castling = castling
+        self.enpassant_sq = enpassant_sq
+        self.halfmove_clk = halfmove_clk
+        self.fullmove_num = fullmove_num
+
+    def __repr__(self):
+        return "<%s(%r)>" % (self.__class__.__name__, self.move)
+
+
 class Board():
-    """Piece positions and state"""
-    def __init__(self, start_state=FEN_START_STATE, white='h', black='h'):
+    """
+    Piece positions and state. A lazy board leaves the piece legal moves to be
+    computed the first time each is read after a move, rather than all at once.
+    Boards given the same legal move cache share the moves of the positions
+    they have seen
+    """
+    def __init__(self, start_state=FEN_START_STATE, white='h', black='h', lazy=False,
+                 legal_move_cache=None):
+        self._init_attributes(white, black, lazy, legal_move_cache)
+
+        self.reset(start_state=start_state)
+
+        self.update()
 
+    @classmethod
+    def _new_empty(cls, white='h', black='h', lazy=False, legal_move_cache=None):
+        """Return a board with its attributes set up but no position loaded"""
+        board = cls.__new__(cls)
+        board._init_attributes(white, black, lazy, legal_move_cache)
+        return board
+
+    def _init_attributes(self, white, black, lazy, legal_move_cache):
+        """Set up the pieces, players and empty game state of a new board"""
         self.pieces = Pieces()
+        self.pieces.lazy = lazy
+        self.legal_move_cache = (legal_move_cache if legal_move_cache is not None
+                                 else LegalMoveCache())
+        self.bitboard = BitBoard()
         self.players = Players(DECODE_PLAYER[white](), DECODE_PLAYER[black]())
 
         self.positions = [None]*64
         self.halfmove_clk = None
         self.fullmove_num = None
+        # Castling mask, bit n set for the right CASTLING_RIGHTS[n], and the
+        # square skipped by a pawn that just moved two squares
+        self.castling = 0
+        self.enpassant_sq = None
 
         self.last_move_info = {'success': True, 'check_attackers': []}
         self.turn_clock = 0
 
-        self.reset(start_state=start_state)
-
-        self.update()
+        # Undo entries for every move made with push(), most recent last
+        self.undo_stack = []
+        # Zobrist key of the current position and of every position reached, one per ply
+        self.key = 0
+        self.position_history = []
+        # One byte per square plus a state header, see chessboard.boardbuffer
+        self.buffer = bytearray(boardbuffer.BUFFER_SIZE)
+        # Zobrist key and the legal moves of that position by UCI move
+        self._legal_uci_moves = (None, {})
 
     def reset(self, start_state=None):
         """Empty the board of pieces and state"""
+        self._clear()
+        if start_state is not None:
+            self._init_board_from_FEN(start_state)
+        else:
+            self._init_board_from_FEN(FEN_START_STATE)
+        self._init_position()
+
+    def _clear(self):
+        """Remove every piece and forget the game state"""
         self.positions = [None]*64
         self.pieces.reset()
         self.players.reset()
         self.halfmove_clk = None
         self.fullmove_num = None
+        self.castling = 0
+        self.enpassant_sq = None
         self.last_move_info = {'success': True, 'check_attackers': []}
-        if start_state is not None:
-            self._init_board_from_FEN(start_state)
-        else:
-            self._init_board_from_FEN(FEN_START_STATE)
+        self.undo_stack = []
+        self.buffer[:] = bytes(boardbuffer.BUFFER_SIZE)
+
+    def _init_position(self):
+        """Derive the piece state, zobrist key and buffer of a freshly loaded position"""
+        self.bitboard.load(self.positions)
         self.update()
+        self.key = zobrist.hash_position(self.bitboard, self.players.current_player.allegiance,
+                                         self.castling, self.enpassant_sq)
+        self.position_history = [self.key]
+        for idx, piece in enumerate(self.positions):
+            if piece is not None:
+                self.buffer[idx] = boardbuffer.PIECE_CODES[(str(piece), piece.allegiance)]
+        self._write_buffer_header()
 
     @utils.algebraic
     def is_occupied(self, idx):
@@ -91,23 +219,63 @@ class Board():
         parser = FENParser(fen)
         if parser.is_valid():
             parser.parse()
-        self.halfmove_clk = parser.halfmove_clk
-        self.fullmove_num = parser.fullmove_num
-        for piece_dict in parser.record:
+        self._init_board_from_record(parser.record, parser.active_allegiance,
+                                     parser.halfmove_clk, parser.fullmove_num)
+
+    def _init_board_from_record(self, record, active_allegiance, halfmove_clk, fullmove_num):
+        """Create the pieces of a FENParser style record and set the game state"""
+        self.halfmove_clk = halfmove_clk
+        self.fullmove_num = fullmove_num
+        for piece_dict in record:
             piece_inst = self._create_piece(piece_dict)
             self.pieces.add(piece_inst)
             self.positions[piece_dict['pos_idx']] = piece_inst
-        self.players.set_current_player(parser.active_allegiance)
+            for side in ['king', 'queen']:
+                if piece_dict.get('%s_side_castle_allowed' % side):
+                    self.castling |= CASTLING_BITS[(piece_dict['allegiance'], side)]
+            if piece_dict.get('enpassant_sq') is not None:
+                self.enpassant_sq = piece_dict['enpassant_sq']
+        # A right is only kept with the king and rook on their home squares
+        for (allegiance, side), bit in CASTLING_BITS.items():
+            king = self.positions[CASTLING_POSITIONS[allegiance]['king_home_square']]
+            rook = self.positions[CASTLING_POSITIONS[allegiance]['%s_side_rook_pos' % side]]
+            if not (str(king) == 'king' and king.allegiance == allegiance and
+                    str(rook) == 'rook' and rook.allegiance == allegiance):
+                self.castling &= ~bit
+        self.players.set_current_player(active_allegiance)
+
+    def as_buffer(self):
+        """
+        Return a read only view of the board buffer. The view is not a copy, it
+        follows every push() and pop(). See chessboard.boardbuffer for the layout
+        """
+        return memoryview(self.buffer).toreadonly()
+
+    def load_buffer(self, buffer):
+        """Reset the board to the position held in a board buffer"""
+        record, active_allegiance, halfmove_clk, fullmove_num = boardbuffer.decode(buffer)
+        self._clear()
+        self._init_board_from_record(record, active_allegiance, halfmove_clk, fullmove_num)
+        self._init_position()
+
+    @classmethod
+    def from_buffer(cls, buffer, white='h', black='h', lazy=False, legal_move_cache=None):
+        """
+        Return a new board from any object exposing a board buffer. The pieces
+        are created straight from the buffer, no start position is set up first
+        """
+        board = cls._new_empty(white=white, black=black, lazy=lazy,
+                               legal_move_cache=legal_move_cache)
+        board.load_buffer(buffer)
+        return board
 
     def _create_piece(self, piece_dict):
         """Return a piece instance from a name, board index and allegiance"""
         piece_module = __import__('%s.%s' % (__name__.split('.')[0],
                                              piece_dict['piece_name']))
         piece_class = getattr(piece_module, piece_dict['piece_name'].capitalize())
-        piece_inst = piece_class(init_position=piece_dict['pos_idx'],
-                                 allegiance=piece_dict['allegiance'])
-        piece_inst.__dict__ = {**piece_inst.__dict__, **piece_dict}
-        return piece_inst
+        return piece_class(init_position=piece_dict['pos_idx'],
+                           allegiance=piece_dict['allegiance'])
 
     def _create_promotion_piece(self, promotion_choice):
         """
@@ -130,51 +298,290 @@ class Board():
 
     def get_FEN(self) -> str:
         """Returns the current state of the board as an FEN string"""
-        return FENBuilder(self.pieces, self.players, self.halfmove_clk, self.fullmove_num).build()
+        return FENBuilder(self.pieces, self.players, self.halfmove_clk, self.fullmove_num,
+                          bitboard=self.bitboard, castling=self.castling,
+                          enpassant_sq=self.enpassant_sq).build()
 
     def move(self, move):
-        """Do a move 2 turns"""
+        """Do a move 2 turns, or a single turn given as a 16 bit move"""
+        if isinstance(move, int):
+            self.turn(move)
+            return
         turns = move.split(' ')
         for turn in turns:
             self.turn(turn)
 
     @utils.algebraic_move
-    def turn(self, piece, end_idx, promotion_choice=None):
-        """Move the given piece to the given positional index"""
+    def turn(self, piece, end_idx=None, promotion_choice=None):
+        """
+        Move the given piece to the given positional index. The move can also be
+        given as a single 16 bit move
+        """
+        if end_idx is None and isinstance(piece, int):
+            start_idx, end_idx, promotion_choice = decode_move(piece)
+            piece = self.positions[start_idx]
+            if piece is None:
+                raise utils.InvalidMoveException('There is no piece on %s to move' %
+                                                 utils.idx_to_algebra(start_idx))
         if end_idx not in piece.legal_moves:
             raise utils.InvalidMoveException(
                 '%s is not a legal move for the piece %s' % (utils.idx_to_algebra(end_idx),
                                                              piece.get_overview()))
         self.pieces.reset_promotion()
-        promotion_piece = self._create_promotion_piece(promotion_choice)
-        move = Move(self.positions, piece, end_idx, promotion_piece=promotion_piece)
-        self.pieces.mask(*move.pieces_to_remove)
+        self.push((piece.pos_idx, end_idx, promotion_choice))
+        self.last_move_info['success'] = True
+        self.last_move_info['check_attackers'] = []
         self.update()
-        self.pieces.masked_pieces.clear()
-        if self.is_in_check(self.players.current_player.allegiance):
-            self.last_move_info['success'] = False
-            self.last_move_info['check_attackers'] = self.get_check_attackers(
-                self.players.current_player.allegiance, pos_idx=True)
-            move.revert()
-            self.update()
+        self.turn_clock = not self.turn_clock
+
+    def push_uci(self, uci):
+        """
+        Make a move given in UCI long algebraic notation and return it as a 16
+        bit move. The move is parsed with a lookup table and checked against
+        the legal moves of the moving piece only
+        """
+        return self.apply_uci_moves([uci])[0]
+
+    def apply_uci_moves(self, moves):
+        """
+        Make a sequence of UCI long algebraic moves, given as an iterable or a
+        space separated string, and return them as 16 bit moves. The pieces are
+        updated once at the end. An illegal move raises InvalidMoveException with
+        the moves before it made
+        """
+        if isinstance(moves, str):
+            moves = moves.split()
+        pushed = []
+        try:
+            for uci in moves:
+                move = self._uci_to_legal_move(uci)
+                if move is None:
+                    raise utils.InvalidMoveException('%s is not a legal move in this position'
+                                                     % uci)
+                self.push(move)
+                pushed.append(move)
+        finally:
+            if pushed:
+                self.pieces.reset_promotion()
+                self.last_move_info['success'] = True
+                self.last_move_info['check_attackers'] = []
+                self.update()
+                self.turn_clock = (self.turn_clock + len(pushed)) % 2 == 1
+        return pushed
+
+    def _uci_to_legal_move(self, uci):
+        """
+        Return the 16 bit move of a UCI move if it is legal in this position or
+        None. The promotion piece may be given in either case, as in is_legal()
+        """
+        uci = uci[:4] + uci[4:].lower()
+        key, legal_moves = self._legal_uci_moves
+        if key == self.key:
+            return legal_moves.get(uci)
+        start_idx, end_idx = UCI_SQUARES.get(uci[:2]), UCI_SQUARES.get(uci[2:4])
+        if start_idx is None or end_idx is None or len(uci) > 5:
+            return None
+        move = (start_idx, end_idx, uci[4:] or None)
+        if move not in self.generate_legal_moves(from_mask=1 << start_idx):
+            return None
+        return self.encode_move(*move)
+
+    def push(self, move):
+        """
+        Make a move given as a (start_idx, end_idx, promotion_choice) tuple or a
+        16 bit move and record how to undo it. The move is assumed to be legal
+        and the piece move lists are left for the next update()
+        """
+        if isinstance(move, int):
+            start_idx, end_idx, promotion_choice = decode_move(move)
         else:
-            self.last_move_info['success'] = True
-            self.last_move_info['check_attackers'] = []
-        move.do_post_move()
-        self.pieces.remove(*move.pieces_to_remove)
-        self.pieces.add(*move.pieces_to_add)
-        self.pieces.reset_enpassant()
-        move.check_double_pawn_move()
-        if move.switch_players:
-            self.players.switch_player()
-            if self.players.current_player.allegiance == 'white':
-                self.fullmove_num += 1
-        if move.capture or move.pawn_advance:
+            start_idx, end_idx = move[0], move[1]
+            promotion_choice = move[2] if len(move) > 2 else None
+        piece = self.positions[start_idx]
+        name, allegiance = str(piece), piece.allegiance
+        captured = self.positions[end_idx]
+        captured_idx = end_idx
+        castling, enpassant_sq = self.castling, self.enpassant_sq
+        rook = rook_start = rook_end = promotion_piece = None
+
+        if name == 'pawn' and end_idx == enpassant_sq and captured is None:
+            captured_idx = end_idx + (8 if allegiance == 'white' else -8)
+            captured = self.positions[captured_idx]
+        elif name == 'king' and abs(end_idx - start_idx) == 2:
+            side = 'king' if end_idx > start_idx else 'queen'
+            rook_start = CASTLING_POSITIONS[allegiance]['%s_side_rook_pos' % side]
+            rook_end = CASTLING_POSITIONS[allegiance]['%s_side_transition' % side][-2]
+            rook = self.positions[rook_start]
+
+        if captured is not None:
+            self._remove_piece(captured, captured_idx)
+            self.pieces.remove(captured)
+        self._relocate_piece(piece, start_idx, end_idx)
+        if rook is not None:
+            self._relocate_piece(rook, rook_start, rook_end)
+        if name == 'pawn' and end_idx // 8 == PROMOTION_ROW[allegiance]:
+            if promotion_choice is None:
+                piece.up_for_promotion = True
+            else:
+                promotion_piece = self._promote(piece, promotion_choice)
+
+        self.undo_stack.append(UndoEntry(move, piece, captured, captured_idx, promotion_piece,
+                                         rook, rook_start, rook_end, castling, enpassant_sq,
+                                         self.halfmove_clk, self.fullmove_num))
+        self.castling &= CASTLING_RIGHTS_MASKS[start_idx] & CASTLING_RIGHTS_MASKS[end_idx]
+        self.key ^= zobrist.castling_key(castling ^ self.castling)
+        if enpassant_sq is not None:
+            self.enpassant_sq = None
+            self.key ^= zobrist.enpassant_key(enpassant_sq)
+        if name == 'pawn' and abs(end_idx - start_idx) == 16:
+            self.enpassant_sq = (start_idx + end_idx) // 2
+            self.key ^= zobrist.enpassant_key(self.enpassant_sq)
+
+        if captured is not None or name == 'pawn':
             self.halfmove_clk = 0
         else:
             self.halfmove_clk += 1
-        self.update()
-        self.turn_clock = not self.turn_clock
+        if allegiance == 'black':
+            self.fullmove_num += 1
+        self.players.switch_player()
+        self.key ^= zobrist.BLACK_TO_MOVE_KEY
+        self.position_history.append(self.key)
+        self._write_buffer_header()
+
+    @property
+    def move_stack(self):
+        """The moves made with push() that can be undone, oldest first"""
+        return [entry.move for entry in self.undo_stack]
+
+    def pop(self):
+        """Undo the last move made with push() and return it"""
+        entry = self.undo_stack.pop()
+        move, piece, captured, promotion_piece, rook = (entry.move, entry.piece, entry.captured,
+                                                        entry.promotion_piece, entry.rook)
+        self.castling, self.enpassant_sq = entry.castling, entry.enpassant_sq
+        self.halfmove_clk, self.fullmove_num = entry.halfmove_clk, entry.fullmove_num
+        self.position_history.pop()
+        start_idx, end_idx = decode_move(move)[:2] if isinstance(move, int) else move[:2]
+        self.players.switch_player()
+
+        if promotion_piece is not None:
+            self._remove_piece(promotion_piece, end_idx)
+            self.pieces.remove(promotion_piece)
+            self.pieces.lost_pieces.remove(promotion_piece)
+            self.pieces.lost_pieces.remove(piece)
+            self.pieces.add(piece)
+            self._place_piece(piece, end_idx)
+        if str(piece) == 'pawn':
+            piece.up_for_promotion = False
+        if rook is not None:
+            self._relocate_piece(rook, entry.rook_end, entry.rook_start)
+        self._relocate_piece(piece, end_idx, start_idx)
+        if captured is not None:
+            self.pieces.lost_pieces.remove(captured)
+            self.pieces.add(captured)
+            self._place_piece(captured, entry.captured_idx)
+
+        self.key = self.position_history[-1]
+        self._write_buffer_header()
+        return move
+
+    def position(self):
+        """Return an immutable, hashable snapshot of the current position"""
+        return Position(self.buffer, self.key)
+
+    @classmethod
+    def from_position(cls, position, white='h', black='h', lazy=False, legal_move_cache=None):
+        """
+        Return a new board set up from a Position. The pieces are created
+        straight from the position, no start position is set up first
+        """
+        board = cls._new_empty(white=white, black=black, lazy=lazy,
+                               legal_move_cache=legal_move_cache)
+        board.load_buffer(position.buffer)
+        return board
+
+    def _write_buffer_header(self):
+        """Refresh the side to move, castling, enpassant and clock bytes of the buffer"""
+        boardbuffer.write_header(self.buffer, self.players.current_player.allegiance,
+                                 self.castling, self.enpassant_sq, self.halfmove_clk,
+                                 self.fullmove_num)
+
+    def _place_piece(self, piece, idx):
+        """Put a piece on a square of the positions and bitboard"""
+        self.positions[idx] = piece
+        piece.pos_idx = idx
+        self.bitboard.add(idx, str(piece), piece.allegiance)
+        self.buffer[idx] = boardbuffer.PIECE_CODES[(str(piece), piece.allegiance)]
+        self.key ^= zobrist.PIECE_KEYS[piece.allegiance][str(piece)][idx]
+
+    def _remove_piece(self, piece, idx):
+        """Take a piece off a square of the positions and bitboard"""
+        self.positions[idx] = None
+        self.bitboard.remove(idx, str(piece), piece.allegiance)
+        self.buffer[idx] = 0
+        self.key ^= zobrist.PIECE_KEYS[piece.allegiance][str(piece)][idx]
+
+    def _relocate_piece(self, piece, start_idx, end_idx):
+        """Move a piece between two squares of the positions and bitboard"""
+        self._remove_piece(piece, start_idx)
+        self._place_piece(piece, end_idx)
+
+    def _promote(self, pawn, promotion_choice):
+        """Replace a pawn on the board with a piece of the promotion choice"""
+        promotion_piece = self._create_promotion_piece(promotion_choice)
+        promotion_piece.allegiance = pawn.allegiance
+        promotion_piece.promoted_piece = True
+        idx = pawn.pos_idx
+        self._remove_piece(pawn, idx)
+        self.pieces.remove(pawn)
+        self.pieces.add(promotion_piece)
+        self._place_piece(promotion_piece, idx)
+        return promotion_piece
+
+    def is_attacked(self, square, allegiance):
+        """
+        Return True if the square, by positional index or algebraic expression,
+        is attacked by a piece of the given allegiance
+        """
+        if isinstance(square, str):
+            square = utils.algebra_to_idx(square)
+        return self.bitboard.is_attacked(square, allegiance)
+
+    def attackers(self, square, allegiance):
+        """
+        Return the positions of the pieces of the given allegiance attacking the
+        square, given by positional index or algebraic expression
+        """
+        if isinstance(square, str):
+            square = utils.algebra_to_idx(square)
+        return squares(self.bitboard.attackers(square, allegiance))
+
+    def see(self, move):
+        """
+        Return the static exchange evaluation of a move given as a (start_idx,
+        end_idx, promotion_choice) tuple or a 16 bit move. That is the material
+        in centipawns the mover wins once the captures on the end square are
+        played out, without making any moves
+        """
+        if isinstance(move, int):
+            start_idx, end_idx, promotion_choice = decode_move(move)
+        else:
+            start_idx, end_idx = move[0], move[1]
+            promotion_choice = move[2] if len(move) > 2 else None
+        return see(self.bitboard, start_idx, end_idx, enpassant_sq=self.enpassant_sq,
+                   promotion_choice=promotion_choice)
+
+    def _is_king_attacked(self, allegiance):
+        """Return True if the king of the given allegiance is attacked"""
+        king_mask = self.bitboard.pieces[allegiance]['king']
+        if not king_mask:
+            return False
+        return self.is_attacked(king_mask.bit_length() - 1, OPPOSING_ALLEGIANCE[allegiance])
+
+    def _get_king_attackers(self, allegiance):
+        """Return the positions of the pieces attacking the king of an allegiance"""
+        king_mask = self.bitboard.pieces[allegiance]['king']
+        return self.attackers(king_mask.bit_length() - 1, OPPOSING_ALLEGIANCE[allegiance])
 
     def do_computer_move(self):
         """If the current player is a computer, execute their move"""
@@ -182,14 +589,13 @@ class Board():
             print('Current player is Human. This has no effect')
         else:
             self.update()
-            self.players.current_player.set_position(self.get_FEN())
-            best_move = self.players.current_player.get_best_move()
-            piece_alg, end_alg, promotion_choice = utils.long_algebra_to_move(best_move)
-            piece = self.get_piece(piece_alg)
-            end_idx = utils.algebra_to_idx(end_alg)
-            if not promotion_choice:
-                promotion_choice = None
-            self.turn(piece, end_idx, promotion_choice=promotion_choice)
+            player = self.players.current_player
+            book_move = player.get_book_move(self)
+            if book_move is not None:
+                self.turn(book_move)
+                return
+            player.set_position(self.get_FEN())
+            self.push_uci(player.get_best_move())
 
     @utils.algebraic
     def scout(self, idx):
@@ -201,10 +607,18 @@ class Board():
 
     @utils.algebraic
     def get_legal_moves(self, idx, pos_idx=False):
-        """Given the board state get the legal moves of a piece"""
+        """
+        Given the board state get the legal moves of a piece. The moves of the
+        side to move come from the legal move cache
+        """
         if not self.is_occupied(idx):
             return None
-        legal_moves = self.get_piece(idx).legal_moves
+        piece = self.get_piece(idx)
+        if piece.allegiance == self.players.current_player.allegiance:
+            legal_moves = list(dict.fromkeys(move_end(move) for move in self.legal_moves()
+                                             if move_start(move) == idx))
+        else:
+            legal_moves = piece.legal_moves
         if pos_idx:
             return legal_moves
         algs = utils.idx_to_algebra(*legal_moves)
@@ -215,63 +629,251 @@ class Board():
         Return a list of piece positions that are currently placing the king
         with the given allegiance in check
         """
-        attackers = []
-        king_loc = self.pieces.get_king(allegiance).pos_idx
-        z = ALLEGIANCES.index(allegiance)
-        for piece in self.pieces.get_pieces_by_allegiance(ALLEGIANCES[not z]):
-            if king_loc in piece.legal_moves:
-                attackers.append(piece.pos_idx)
+        attackers = self._get_king_attackers(allegiance)
         if pos_idx:
             return attackers
         return utils.idx_to_algebra(*attackers)
 
     def update(self):
-        """Update the board elements after a change in positions"""
-        self.pieces.update(self.positions)
-
-    def _update_mate(self):
-        """Update the board elements to check for mate"""
-        self.pieces.update(self.positions, mate=True)
+        """
+        Update the board elements after a change in positions. The bitboard is
+        kept current by push() and pop() so only the pieces are updated
+        """
+        self.pieces.update(self.positions, bitboard=self.bitboard, castling=self.castling,
+                           enpassant_sq=self.enpassant_sq)
 
     def is_in_check(self, allegiance):
         """Returns whether the king with the given allegiance is in check"""
-        return self.pieces.get_king(allegiance).in_check
+        return self._is_king_attacked(allegiance)
 
     def promote_pawn(self, promotion_choice):
         """Promote a pawn with a selected piece if a pawn needs promoting"""
-        promotion_piece = self._create_promotion_piece(promotion_choice)
         piece_to_be_promoted = self.pieces.get_pawn_promotion_piece()
-        promotion_piece.pos_idx = piece_to_be_promoted.pos_idx
-        promotion_piece.allegiance = piece_to_be_promoted.allegiance
-        promotion_piece.promoted_piece = True
-        self.pieces.remove(piece_to_be_promoted)
-        self.pieces.add(promotion_piece)
-        self.positions[piece_to_be_promoted.pos_idx] = promotion_piece
+        promotion_piece = self._promote(piece_to_be_promoted, promotion_choice)
+        piece_to_be_promoted.up_for_promotion = False
+        # Let pop() undo the promotion along with the pawn move
+        if self.undo_stack and self.undo_stack[-1].piece is piece_to_be_promoted:
+            self.undo_stack[-1].promotion_piece = promotion_piece
+        self.position_history[-1] = self.key
 
-    def check_endgame(self):
+    def generate_legal_moves(self, stage=None, from_mask=ALL_SQUARES):
         """
-        This function will check whether we have transitioned to a checkmate or
-        stalemate state
+        Yield every legal move of the side to move as a (start_idx, end_idx,
+        promotion_choice) tuple ready for push(). Works straight from the
+        bitboard so it stays correct between push() and update(). A stage of
+        'captures' or 'quiets' yields only the moves of that stage and from_mask
+        limits the moves to the pieces on its squares
+        """
+        allegiance = self.players.current_player.allegiance
+        castling = [side for (rights_allegiance, side), bit in CASTLING_BITS.items()
+                    if self.castling & bit and rights_allegiance == allegiance]
+        pawns = self.bitboard.pieces[allegiance]['pawn']
+        for start_idx, end_idx in generate_legal_moves(self.bitboard, allegiance,
+                                                       enpassant_sq=self.enpassant_sq,
+                                                       castling=castling, stage=stage,
+                                                       from_mask=from_mask):
+            if pawns >> start_idx & 1 and end_idx // 8 == PROMOTION_ROW[allegiance]:
+                for promotion_choice in PROMOTION_CHOICES:
+                    yield start_idx, end_idx, promotion_choice
+            else:
+                yield start_idx, end_idx, None
+
+    def iter_legal_moves(self, stage=None):
+        """
+        Lazily yield the legal moves of the side to move, captures and
+        promotions first and then quiet moves. Nothing is generated for a stage
+        the caller stops before. Give stage as 'captures' or 'quiets' for one
+        stage only
+        """
+        if stage is not None and stage not in STAGES:
+            raise ValueError('Unknown move generation stage %s, expected one of %s' %
+                             (stage, STAGES))
+        for generation_stage in STAGES if stage is None else [stage]:
+            yield from self.generate_legal_moves(stage=generation_stage)
+
+    def legal_moves(self):
+        """
+        Return every legal move of the side to move as 16 bit moves. The moves
+        are kept in the legal move cache under the zobrist key
+        """
+        moves = self.legal_move_cache.get(self.key)
+        if moves is None:
+            moves = self._generate_encoded_moves()
+            self.legal_move_cache.put(self.key, moves)
+        return array('H', moves)
+
+    def _generate_encoded_moves(self):
+        """Return every legal move of the side to move as an array of 16 bit moves"""
+        moves = array('H')
+        allegiance = self.players.current_player.allegiance
+        masks = self.bitboard.pieces[allegiance]
+        enpassant_sq = self.enpassant_sq
+        for start_idx, end_idx, promotion_choice in self.generate_legal_moves():
+            flag = FLAG_NORMAL
+            if end_idx == enpassant_sq and masks['pawn'] >> start_idx & 1:
+                flag = FLAG_ENPASSANT
+            elif abs(end_idx - start_idx) == 2 and masks['king'] >> start_idx & 1:
+                flag = FLAG_CASTLING
+            moves.append(encode_move(start_idx, end_idx, promotion_choice, flag))
+        return moves
+
+    def is_legal(self, move):
+        """
+        Return True if the move, a UCI or SAN string or a 16 bit move, is legal
+        for the side to move. Nothing is raised for malformed input and the
+        board is left untouched
+        """
+        legal_moves = self._get_legal_uci_moves()
+        if isinstance(move, int):
+            return 0 <= move <= 0xffff and move_to_uci(move) in legal_moves
+        if not isinstance(move, str):
+            return False
+        return move in legal_moves or self._san_to_uci(move, legal_moves) is not None
+
+    def _get_legal_uci_moves(self):
+        """Return a dict of the 16 bit legal moves keyed by UCI move, kept per position"""
+        key, legal_moves = self._legal_uci_moves
+        if key != self.key:
+            legal_moves = {move_to_uci(move): move for move in self.legal_moves()}
+            self._legal_uci_moves = (self.key, legal_moves)
+        return legal_moves
+
+    def _san_to_uci(self, san, legal_moves):
+        """Return the UCI move of the one legal move matching a SAN move or None"""
+        san = san.rstrip('+#†')
+        if san in SAN_CASTLING_SIDES:
+            positions = CASTLING_POSITIONS[self.players.current_player.allegiance]
+            uci = utils.move_to_long_algebra(
+                positions['king_home_square'],
+                positions['%s_side_transition' % SAN_CASTLING_SIDES[san]][-1])
+            return uci if uci in legal_moves else None
+        match = SAN_PATTERN.fullmatch(san)
+        if match is None:
+            return None
+        piece_char, file_char, rank_char, end_alg, promotion_char = match.groups()
+        name = NOTATION[piece_char.lower()] if piece_char else 'pawn'
+        promotion_choice = promotion_char.lower() if promotion_char else None
+        found = None
+        for uci in legal_moves:
+            if (uci[2:4] != end_alg or (uci[4:] or None) != promotion_choice or
+                    (file_char and uci[0] != file_char) or (rank_char and uci[1] != rank_char)):
+                continue
+            if str(self.positions[utils.algebra_to_idx(uci[:2])]) != name:
+                continue
+            if found is not None:
+                return None
+            found = uci
+        return found
+
+    def encode_move(self, start_idx, end_idx, promotion_choice=None):
+        """Return the 16 bit move, flagged for enpassant or castling in this position"""
+        piece = self.positions[start_idx]
+        flag = FLAG_NORMAL
+        if piece is not None and str(piece) == 'pawn' and end_idx == self.enpassant_sq:
+            flag = FLAG_ENPASSANT
+        elif piece is not None and str(piece) == 'king' and abs(end_idx - start_idx) == 2:
+            flag = FLAG_CASTLING
+        return encode_move(start_idx, end_idx, promotion_choice, flag)
+
+    def perft(self, depth):
+        """Count the leaf nodes of the legal move tree to the given depth"""
+        if depth <= 0:
+            return 1
+        moves = list(self.generate_legal_moves())
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            self.push(move)
+            nodes += self.perft(depth - 1)
+            self.pop()
+        return nodes
+
+    def perft_divide(self, depth):
+        """Return the perft node count below each legal move in long algebraic notation"""
+        divide = {}
+        for move in list(self.generate_legal_moves()):
+            self.push(move)
+            divide[utils.move_to_long_algebra(*move)] = self.perft(depth - 1)
+            self.pop()
+        return divide
+
+    def status(self):
+        """
+        Return the result of the game in the current position or None if it is
+        still in progress. That is 'Checkmate', 'Stalemate', 'Insufficient
+        material', 'Fifty-move rule' or 'Threefold repetition'
         """
-        self._update_mate()
         current_player_allegiance = self.players.current_player.allegiance
-        move_check_status = []
-        in_check = self.is_in_check(current_player_allegiance)
-        for piece in self.pieces.get_pieces_by_allegiance(current_player_allegiance):
-            for legal_move in piece.legal_moves:
-                move = Move(self.positions, piece, legal_move)
-                self.pieces.mask(*move.pieces_to_remove)
-                self._update_mate()
-                self.pieces.masked_pieces.clear()
-                move_check_status.append(self.is_in_check(current_player_allegiance))
-                move.revert()
-                self._update_mate()
-        if all(move_check_status):
-            if in_check:
+        if not self._has_legal_move():
+            if self._is_king_attacked(current_player_allegiance):
                 return 'Checkmate'
             return 'Stalemate'
+        if self.is_insufficient_material():
+            return 'Insufficient material'
+        if self.halfmove_clk >= 100:
+            return 'Fifty-move rule'
+        if self.is_threefold_repetition():
+            return 'Threefold repetition'
         return None
 
+    def check_endgame(self):
+        """
+        This function will check whether we have transitioned to a checkmate,
+        stalemate or drawn state
+        """
+        return self.status()
+
+    def _has_legal_move(self):
+        """Return True as soon as the side to move has a legal move"""
+        for _ in self.iter_legal_moves():
+            return True
+        return False
+
+    def is_insufficient_material(self):
+        """
+        Return True if neither side can checkmate. That is only kings and at
+        most one minor piece, or only bishops all on the same colour squares
+        """
+        masks = [self.bitboard.pieces[allegiance] for allegiance in ALLEGIANCES]
+        if any(mask['pawn'] | mask['rook'] | mask['queen'] for mask in masks):
+            return False
+        knights = masks[0]['knight'] | masks[1]['knight']
+        bishops = masks[0]['bishop'] | masks[1]['bishop']
+        minors = knights | bishops
+        if not minors & (minors - 1):
+            return True
+        return not knights and (not bishops & LIGHT_SQUARES or not bishops & ~LIGHT_SQUARES)
+
+    def is_repetition(self, count=3):
+        """
+        Return True if the current position has occurred at least count times.
+        Only the positions since the last capture or pawn move, with the same
+        side to move, are looked at
+        """
+        history = self.position_history
+        current = history[-1]
+        plies = min(self.halfmove_clk, len(history) - 1)
+        if count <= 1:
+            return True
+        for ply in range(2, plies + 1, 2):
+            if history[-1 - ply] == current:
+                count -= 1
+                if count <= 1:
+                    return True
+        return False
+
+    def is_threefold_repetition(self):
+        """Return True if the current position has occurred three times"""
+        return self.is_repetition(3)
+
+    def can_claim_draw(self):
+        """
+        Return True if the side to move can claim a draw under the fifty-move
+        rule or by threefold repetition
+        """
+        return self.halfmove_clk >= 100 or self.is_repetition(3)
+
     def PGN(self, str_):
         """Do some moves from a PGN string"""
         moves = re.split(r'\s?[0-9]+\.', str_)[1:]
@@ -0,0 +1,85 @@
+"""
+Flat byte layout of a board position. Bytes 0-63 hold one piece code per board
+positional index (a8 is 0, h1 is 63) followed by a small header for the side to
+move, castling rights, enpassant square and clocks. The halfmove clock saturates
+at 255 and the fullmove number at 65535. The layout is plain bytes so it can be
+shared through the buffer protocol without building a FEN string
+"""
+
+from settings import ALLEGIANCES, NOTATION, CASTLING_RIGHTS
+
+PIECE_NAMES = list(NOTATION.values())
+
+# Piece codes are 1-6 in PIECE_NAMES order with BLACK_FLAG set for black, 0 is empty
+BLACK_FLAG = 8
+PIECE_CODES = {(name, allegiance): (PIECE_NAMES.index(name) + 1) |
+               (BLACK_FLAG if allegiance == 'black' else 0)
+               for name in PIECE_NAMES for allegiance in ALLEGIANCES}
+CODE_PIECES = {code: piece for piece, code in PIECE_CODES.items()}
+
+# Header offsets. Castling holds one bit per right in CASTLING_RIGHTS order, the
+# halfmove clock saturates at 255 and the fullmove number is little endian,
+# saturating at 65535
+SIDE_TO_MOVE = 64
+CASTLING = 65
+ENPASSANT = 66
+HALFMOVE = 67
+FULLMOVE = 68
+BUFFER_SIZE = 70
+
+NO_ENPASSANT = 255
+
+
+class BoardBufferException(BaseException):
+    """Exception to catch buffers that do not hold a board position"""
+
+    def __init__(self, message):
+        super(BoardBufferException, self).__init__()
+        self.message = 'Invalid board buffer: %s' % message
+
+    def __str__(self):
+        return self.message
+
+
+def write_header(buffer, allegiance, castling, enpassant_sq, halfmove_clk, fullmove_num):
+    """Write the side to move, castling mask, enpassant square and clocks into a buffer"""
+    buffer[SIDE_TO_MOVE] = allegiance == 'black'
+    buffer[CASTLING] = castling
+    buffer[ENPASSANT] = NO_ENPASSANT if enpassant_sq is None else enpassant_sq
+    buffer[HALFMOVE] = min(halfmove_clk, 255)
+    fullmove_num = min(fullmove_num, 0xffff)
+    buffer[FULLMOVE] = fullmove_num & 0xff
+    buffer[FULLMOVE + 1] = fullmove_num >> 8
+
+
+def decode(buffer):
+    """
+    Return a FENParser style record of piece dictionaries along with the active
+    allegiance, halfmove clock and fullmove number held in a buffer
+    """
+    data = memoryview(buffer).cast('B')
+    if len(data) != BUFFER_SIZE:
+        raise BoardBufferException('expected %d bytes, got %d' % (BUFFER_SIZE, len(data)))
+    record = []
+    for idx in range(64):
+        code = data[idx]
+        if not code:
+            continue
+        if code not in CODE_PIECES:
+            raise BoardBufferException('unknown piece code %d on square %d' % (code, idx))
+        name, allegiance = CODE_PIECES[code]
+        record.append({'piece_name': name, 'pos_idx': idx, 'allegiance': allegiance})
+    active_allegiance = 'black' if data[SIDE_TO_MOVE] else 'white'
+    for bit, (allegiance, side) in enumerate(CASTLING_RIGHTS):
+        if data[CASTLING] >> bit & 1:
+            for piece_dict in record:
+                if piece_dict['piece_name'] == 'king' and piece_dict['allegiance'] == allegiance:
+                    piece_dict['%s_side_castle_allowed' % side] = True
+    enpassant_sq = data[ENPASSANT]
+    if enpassant_sq != NO_ENPASSANT:
+        pawn_idx = enpassant_sq + (8 if active_allegiance == 'white' else -8)
+        for piece_dict in record:
+            if piece_dict['piece_name'] == 'pawn' and piece_dict['pos_idx'] == pawn_idx:
+                piece_dict['enpassant_sq'] = enpassant_sq
+    fullmove_num = data[FULLMOVE] | data[FULLMOVE + 1] << 8
+    return record, active_allegiance, data[HALFMOVE], fullmove_num
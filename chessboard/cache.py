@@ -0,0 +1,49 @@
+"""
+Bounded cache of the legal moves of positions keyed by zobrist key. The least
+recently used position is evicted once the cache is full
+"""
+
+from collections import OrderedDict
+from settings import LEGAL_MOVE_CACHE_SIZE
+
+
+class LegalMoveCache():
+    """LRU cache of legal move arrays with hit and miss counters"""
+
+    def __init__(self, maxsize=LEGAL_MOVE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return "<%s(%d/%d entries, %d hits, %d misses)>" % (
+            self.__class__.__name__, len(self), self.maxsize, self.hits, self.misses)
+
+    def get(self, key):
+        """Return the moves stored for a key, marking it recently used, or None"""
+        moves = self.entries.get(key)
+        if moves is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return moves
+
+    def put(self, key, moves):
+        """Store the moves of a key, evicting the least recently used key if full"""
+        if self.maxsize <= 0:
+            return
+        self.entries[key] = moves
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Remove every entry and zero the counters"""
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
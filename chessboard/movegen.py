@@ -0,0 +1,165 @@
+"""
+Strictly legal move generation on the bitboard. The checkers and pinned
+pieces are found once per position so moves that would leave the king
+attacked are discarded without being made
+"""
+
+from settings import OPPOSING_ALLEGIANCE, CASTLING_POSITIONS
+from chessboard.bitboard import squares, rook_attacks, bishop_attacks
+from chessboard.tables import BETWEEN, KING_ATTACKS
+
+ALL_SQUARES = (1 << 64) - 1
+
+# Move generation stages. Captures include every promotion, quiets are the rest
+CAPTURES, QUIETS = 'captures', 'quiets'
+STAGES = [CAPTURES, QUIETS]
+
+# The rank a pawn promotes on
+PROMOTION_RANK_MASK = {'white': 0xff, 'black': 0xff << 56}
+
+
+def _king_idx(bitboard, allegiance):
+    """Return the square of the king of an allegiance or None"""
+    king_mask = bitboard.pieces[allegiance]['king']
+    return king_mask.bit_length() - 1 if king_mask else None
+
+
+def get_checkers(bitboard, allegiance):
+    """Return the mask of the enemy pieces attacking the king of an allegiance"""
+    king_idx = _king_idx(bitboard, allegiance)
+    if king_idx is None:
+        return 0
+    return bitboard.attackers(king_idx, OPPOSING_ALLEGIANCE[allegiance])
+
+
+def get_pins(bitboard, allegiance):
+    """
+    Return a dict of the pinned pieces of an allegiance keyed by square. Each
+    value is the mask of squares the piece can move to without exposing its king
+    """
+    king_idx = _king_idx(bitboard, allegiance)
+    if king_idx is None:
+        return {}
+    enemy = OPPOSING_ALLEGIANCE[allegiance]
+    masks = bitboard.pieces[enemy]
+    enemy_occupied = bitboard.occupied[enemy]
+    snipers = ((rook_attacks(king_idx, enemy_occupied) & (masks['rook'] | masks['queen'])) |
+               (bishop_attacks(king_idx, enemy_occupied) & (masks['bishop'] | masks['queen'])))
+    occupied = bitboard.occupancy()
+    pins = {}
+    for sniper in squares(snipers):
+        blockers = BETWEEN[king_idx][sniper] & occupied
+        if blockers & bitboard.occupied[allegiance] and not blockers & (blockers - 1):
+            pins[blockers.bit_length() - 1] = BETWEEN[king_idx][sniper] | (1 << sniper)
+    return pins
+
+
+def get_evasions(bitboard, allegiance, checkers):
+    """
+    Return the mask of squares a piece other than the king can move to given
+    the checkers. That is capturing a single checker or blocking its line
+    """
+    if not checkers:
+        return ALL_SQUARES
+    if checkers & (checkers - 1):
+        return 0
+    checker = checkers.bit_length() - 1
+    return checkers | BETWEEN[_king_idx(bitboard, allegiance)][checker]
+
+
+def get_king_danger(bitboard, allegiance):
+    """
+    Return the squares attacked by the enemy with the king taken off the board,
+    so the king can't step back along the line of a sliding checker
+    """
+    king_mask = bitboard.pieces[allegiance]['king']
+    return bitboard.attacked_squares(OPPOSING_ALLEGIANCE[allegiance],
+                                     bitboard.occupancy() & ~king_mask)
+
+
+def is_enpassant_legal(bitboard, allegiance, start_idx, end_idx, captured_idx):
+    """Return True if an en passant capture doesn't leave the king attacked"""
+    king_idx = _king_idx(bitboard, allegiance)
+    if king_idx is None:
+        return True
+    occupied = (bitboard.occupancy() & ~(1 << start_idx) & ~(1 << captured_idx)) | (1 << end_idx)
+    attackers = bitboard.attackers(king_idx, OPPOSING_ALLEGIANCE[allegiance], occupied)
+    return not attackers & ~(1 << captured_idx)
+
+
+def _castling_targets(bitboard, allegiance, castling, danger):
+    """Return the mask of the castling king moves that are legal"""
+    positions = CASTLING_POSITIONS[allegiance]
+    occupied = bitboard.occupancy()
+    targets = 0
+    for side in castling:
+        rook_pos = positions['%s_side_rook_pos' % side]
+        if not bitboard.pieces[allegiance]['rook'] & (1 << rook_pos):
+            continue
+        if any(occupied & (1 << idx) for idx in positions['%s_side_empty_squares' % side]):
+            continue
+        transition = positions['%s_side_transition' % side]
+        if any(danger & (1 << idx) for idx in transition):
+            continue
+        targets |= 1 << transition[-1]
+    return targets
+
+
+def _stage_masks(allegiance, enemies, stage):
+    """Return the target masks of the pieces and of the pawns for a generation stage"""
+    if stage == CAPTURES:
+        return enemies, enemies | PROMOTION_RANK_MASK[allegiance]
+    if stage == QUIETS:
+        return ~enemies & ALL_SQUARES, ~(enemies | PROMOTION_RANK_MASK[allegiance]) & ALL_SQUARES
+    return ALL_SQUARES, ALL_SQUARES
+
+
+def generate_legal_moves(bitboard, allegiance, enpassant_sq=None, castling=(), stage=None,
+                         from_mask=ALL_SQUARES):
+    """
+    Yield (start_idx, end_idx) for every legal move of an allegiance. castling
+    holds the sides ('king', 'queen') the allegiance still has the right to
+    castle on. A promotion is yielded once, the promotion piece is up to the
+    caller. A stage of CAPTURES or QUIETS yields only the moves of that stage
+    and from_mask limits the moves to the pieces on its squares
+    """
+    allies = bitboard.occupied[allegiance]
+    enemies = bitboard.occupied[OPPOSING_ALLEGIANCE[allegiance]]
+    checkers = get_checkers(bitboard, allegiance)
+    evasions = get_evasions(bitboard, allegiance, checkers)
+    pins = get_pins(bitboard, allegiance)
+    masks = bitboard.pieces[allegiance]
+    piece_targets, pawn_targets = _stage_masks(allegiance, enemies, stage)
+
+    if evasions:
+        for name in ['pawn', 'knight', 'bishop', 'rook', 'queen']:
+            for start_idx in squares(masks[name] & from_mask):
+                if name == 'pawn':
+                    targets = (bitboard.pawn_pushes(start_idx, allegiance) |
+                               (bitboard.attacks(start_idx, name, allegiance) & enemies))
+                    targets &= pawn_targets
+                else:
+                    targets = bitboard.attacks(start_idx, name, allegiance) & ~allies
+                    targets &= piece_targets
+                targets &= evasions & pins.get(start_idx, ALL_SQUARES)
+                for end_idx in squares(targets):
+                    yield start_idx, end_idx
+
+    if enpassant_sq is not None and stage != QUIETS:
+        direction = 8 if allegiance == 'white' else -8
+        captured_idx = enpassant_sq + direction
+        for start_idx in squares(bitboard.attacks(enpassant_sq, 'pawn',
+                                                  OPPOSING_ALLEGIANCE[allegiance]) &
+                                 masks['pawn'] & from_mask):
+            if is_enpassant_legal(bitboard, allegiance, start_idx, enpassant_sq, captured_idx):
+                yield start_idx, enpassant_sq
+
+    king_idx = _king_idx(bitboard, allegiance)
+    if king_idx is not None and from_mask >> king_idx & 1:
+        danger = get_king_danger(bitboard, allegiance)
+        targets = KING_ATTACKS[king_idx] & ~allies & ~danger & piece_targets
+        home_idx = CASTLING_POSITIONS[allegiance]['king_home_square']
+        if stage != CAPTURES and not checkers and king_idx == home_idx:
+            targets |= _castling_targets(bitboard, allegiance, castling, danger)
+        for end_idx in squares(targets):
+            yield king_idx, end_idx
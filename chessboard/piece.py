@@ -1,21 +1,77 @@
 """Base Piece class"""
 
 import utils
-from settings import LEFT_EDGE, RIGHT_EDGE
+from chessboard.bitboard import squares
+from chessboard.tables import RAYS, RELATIVE_DIRECTIONS
+
+
+def lazy_attribute(slot):
+    """
+    Return a property for a slot of piece state that a lazy owner computes
+    along with the legal moves, on the first read after the position changes
+    """
+    def getter(self):
+        owner = self.owner
+        if owner is not None and owner.lazy and self._generation != owner.generation:
+            owner.compute_legal_moves(self)
+        return getattr(self, slot)
+
+    def setter(self, value):
+        setattr(self, slot, value)
+    return property(getter, setter)
+
 
 class Piece():
     """Class for a generic piece"""
 
+    # Per type data shared by every instance, set by each piece class
+    name = None
+    char = None
+
+    __slots__ = ('allegiance', 'pos_idx', 'promoted_piece', 'masked', '_legal_moves',
+                 '_generation', 'owner', '_allies_in_legal_moves', '_illegal_enemy_king_moves')
+
+    allies_in_legal_moves = lazy_attribute('_allies_in_legal_moves')
+    illegal_enemy_king_moves = lazy_attribute('_illegal_enemy_king_moves')
+
     def __init__(self):
         self.allegiance = None
         self.pos_idx = None
 
         self.promoted_piece = False
-        self.move_cnt = 0
+        self.masked = False
+        # The Pieces collection holding this piece and its generation when the
+        # legal moves were last set, see Pieces.lazy
+        self.owner = None
+        self._generation = 0
         self.legal_moves = []
         self.allies_in_legal_moves = []
         self.illegal_enemy_king_moves = []
 
+    @property
+    def legal_moves(self):
+        """
+        The positional indexes this piece can legally move to. With a lazy owner
+        they are computed on the first read after the position changes
+        """
+        owner = self.owner
+        if owner is not None and owner.lazy and self._generation != owner.generation:
+            owner.compute_legal_moves(self)
+        return self._legal_moves
+
+    @legal_moves.setter
+    def legal_moves(self, moves):
+        self._legal_moves = moves
+        if self.owner is not None:
+            self._generation = self.owner.generation
+
+    def __str__(self):
+        return self.name
+
+    def get_char(self):
+        """Return the character representation of this piece"""
+        return self.char.upper() if self.allegiance == 'white' else self.char
+
     def get_overview(self):
         """Return a string describing this piece"""
         dict_ = {'Name': str(self),
@@ -46,140 +102,59 @@ class Piece():
         """Return True if the piece is on the given file"""
         return str(file) == str(self.get_file())
 
-    def _clear_moves(self):
-        """Empty move lists"""
-        self.legal_moves = []
-        self.allies_in_legal_moves = []
-        self.illegal_enemy_king_moves = []
-
-    def fwd(self, *args, pos_idx=False):
-        """Return idx for forward moves"""
-        direction = self.get_direction()
-        indexes = []
-        if not args:
-            args = range(1, 8)
-        for arg in args:
-            idx = self.pos_idx + (8*arg*direction)
-            if idx in range(64):
-                indexes.append(idx)
+    def _update_sliding_legal_moves(self, bitboard):
+        """Calculate the legal moves of a sliding piece from the bitboard masks"""
+        allies = bitboard.occupied[self.allegiance]
+        occupied = bitboard.occupancy()
+        attacks = bitboard.attacks(self.pos_idx, str(self), self.allegiance, occupied)
+        self.legal_moves = squares(attacks & ~allies)
+        self.allies_in_legal_moves = squares(attacks & allies)
+        self.illegal_enemy_king_moves = squares(attacks & ~occupied)
+
+    def _ray(self, direction_name, args, pos_idx):
+        """
+        Return the squares along a direction relative to this piece's direction
+        of play, read from the precomputed ray table. args select squares by
+        their distance from the piece, all squares are returned by default
+        """
+        ray = RAYS[RELATIVE_DIRECTIONS[self.get_direction()][direction_name]][self.pos_idx]
+        if args:
+            indexes = [ray[arg - 1] for arg in args if 0 < arg <= len(ray)]
+        else:
+            indexes = list(ray)
         if pos_idx:
             return indexes
         algs = utils.idx_to_algebra(*indexes)
         return algs if isinstance(algs, list) else [algs]
 
+    def fwd(self, *args, pos_idx=False):
+        """Return idx for forward moves"""
+        return self._ray('fwd', args, pos_idx)
+
     def bkwd(self, *args, pos_idx=False):
         """Return idx for backward moves"""
-        direction = self.get_direction()
-        indexes = []
-        if not args:
-            args = range(1, 8)
-        for arg in args:
-            idx = self.pos_idx - (8*arg*direction)
-            if idx in range(64):
-                indexes.append(idx)
-        if pos_idx:
-            return indexes
-        algs = utils.idx_to_algebra(*indexes)
-        return algs if isinstance(algs, list) else [algs]
+        return self._ray('bkwd', args, pos_idx)
 
     def left(self, *args, pos_idx=False):
         """Return idx for left moves"""
-        direction = self.get_direction()
-        indexes = []
-        if not args:
-            args = range(1, 8)
-        for arg in args:
-            idx = self.pos_idx + (arg*direction)
-            if idx // 8 == self.pos_idx // 8:
-                indexes.append(idx)
-        if pos_idx:
-            return indexes
-        algs = utils.idx_to_algebra(*indexes)
-        return algs if isinstance(algs, list) else [algs]
+        return self._ray('left', args, pos_idx)
 
     def right(self, *args, pos_idx=False):
         """Return idx for right moves"""
-        direction = self.get_direction()
-        indexes = []
-        if not args:
-            args = range(1, 8)
-        for arg in args:
-            idx = self.pos_idx - (arg*direction)
-            if idx // 8 == self.pos_idx // 8:
-                indexes.append(idx)
-        if pos_idx:
-            return indexes
-        algs = utils.idx_to_algebra(*indexes)
-        return algs if isinstance(algs, list) else [algs]
+        return self._ray('right', args, pos_idx)
 
     def dgfl(self, *args, pos_idx=False):
         """Return idx for forward diagonal left moves"""
-        direction = self.get_direction()
-        indexes = []
-        if not args:
-            args = range(1, 8)
-        if self.pos_idx not in LEFT_EDGE[direction]:
-            for arg in args:
-                idx = self.pos_idx + (8*arg*direction + 1*arg*direction)
-                if idx in range(64):
-                    indexes.append(idx)
-                if idx in LEFT_EDGE[direction]:
-                    break
-        if pos_idx:
-            return indexes
-        algs = utils.idx_to_algebra(*indexes)
-        return algs if isinstance(algs, list) else [algs]
+        return self._ray('dgfl', args, pos_idx)
 
     def dgfr(self, *args, pos_idx=False):
         """Return idx for forward diagonal right moves"""
-        direction = self.get_direction()
-        indexes = []
-        if not args:
-            args = range(1, 8)
-        if self.pos_idx not in RIGHT_EDGE[direction]:
-            for arg in args:
-                idx = self.pos_idx + (8*arg*direction + -1*arg*direction)
-                if idx in range(64):
-                    indexes.append(idx)
-                if idx in RIGHT_EDGE[direction]:
-                    break
-        if pos_idx:
-            return indexes
-        algs = utils.idx_to_algebra(*indexes)
-        return algs if isinstance(algs, list) else [algs]
+        return self._ray('dgfr', args, pos_idx)
 
     def dgbl(self, *args, pos_idx=False):
         """Return idx for backward diagonal left moves"""
-        direction = self.get_direction()
-        indexes = []
-        if not args:
-            args = range(1, 8)
-        if self.pos_idx not in LEFT_EDGE[direction]:
-            for arg in args:
-                idx = self.pos_idx - (8*arg*direction + -1*arg*direction)
-                if idx in range(64):
-                    indexes.append(idx)
-                if idx in LEFT_EDGE[direction]:
-                    break
-        if pos_idx:
-            return indexes
-        algs = utils.idx_to_algebra(*indexes)
-        return algs if isinstance(algs, list) else [algs]
+        return self._ray('dgbl', args, pos_idx)
 
     def dgbr(self, *args, pos_idx=False):
         """Return idx for backward diagonal right moves"""
-        direction = self.get_direction()
-        indexes = []
-        if not args:
-            args = range(1, 8)
-        if self.pos_idx not in RIGHT_EDGE[direction]:
-            for arg in args:
-                idx = self.pos_idx - (8*arg*direction + 1*arg*direction)
-                if idx in range(64):
-                    indexes.append(idx)
-                if idx in RIGHT_EDGE[direction]:
-                    break
-        if pos_idx:
-            return indexes
-        algs = utils.idx_to_algebra(*indexes)
-        return algs if isinstance(algs, list) else [algs]
+        return self._ray('dgbr', args, pos_idx)
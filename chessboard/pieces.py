@@ -3,8 +3,17 @@
 from operator import truth
 from collections import OrderedDict
 from chessboard.piece import Piece
+from chessboard.bitboard import BitBoard, squares
+from chessboard.movegen import (ALL_SQUARES, get_checkers, get_pins, get_evasions,
+                                get_king_danger, is_enpassant_legal, generate_legal_moves)
 import utils
-from settings import ALLEGIANCES
+from settings import ALLEGIANCES, OPPOSING_ALLEGIANCE, NOTATION, CASTLING_RIGHTS
+
+
+def _double_move_pawn_idx(enpassant_sq):
+    """Return the square of the pawn that skipped an enpassant square"""
+    return enpassant_sq + 8 if enpassant_sq // 8 == 2 else enpassant_sq - 8
+
 
 class Pieces():
     """Class for a piece collection"""
@@ -12,7 +21,36 @@ class Pieces():
     def __init__(self):
         self.pieces_dict = OrderedDict()
         self.lost_pieces = []
-        self.masked_pieces = []
+        self.bitboard = BitBoard()
+
+        # Indexes kept up to date by add/remove, (name, allegiance) to an
+        # ordered set of pieces and allegiance to the king
+        self.type_index = {}
+        self.kings = {}
+        self._cached_pieces = None
+        self._cached_allegiance_pieces = {}
+
+        # The board positions as of the last update, square to piece
+        self.positions = [None]*64
+
+        # Per square sets of the pieces attacking an empty or enemy occupied
+        # square (attack map) or an ally occupied square (defend map)
+        self.attack_map = [set() for _ in range(64)]
+        self.defend_map = [set() for _ in range(64)]
+        self._attack_masks = {}
+        self._enpassant_pawns = []
+        self._restricted_pieces = set()
+
+        # Game state of the board as of the last update
+        self.castling = 0
+        self.enpassant_sq = None
+
+        # In lazy mode update() only moves on the generation and each piece
+        # computes its legal moves the first time they are read after that
+        self.lazy = False
+        self.generation = 0
+        # Set by a lazy update, the attack maps are rebuilt by the next eager one
+        self._maps_stale = False
 
     def __iter__(self):
         return iter(self.pieces())
@@ -31,16 +69,47 @@ class Pieces():
         """Clear lists"""
         self.pieces_dict = OrderedDict()
         self.lost_pieces = []
-        self.masked_pieces = []
+        self.bitboard = BitBoard()
+        self.type_index = {}
+        self.kings = {}
+        self._clear_cache()
+        self.invalidate()
+
+    def invalidate(self):
+        """Forget the attack maps so that the next update recomputes every piece"""
+        self.attack_map = [set() for _ in range(64)]
+        self.defend_map = [set() for _ in range(64)]
+        self._attack_masks = {}
+        self.positions = [None]*64
+        self._enpassant_pawns = []
+        self._restricted_pieces = set()
+        self._maps_stale = False
+
+    def _clear_cache(self):
+        """Drop the cached piece lists after the collection changes"""
+        self._cached_pieces = None
+        self._cached_allegiance_pieces = {}
 
     def pieces(self):
-        """Get a list of pieces in the collection"""
-        pieces = list(self.pieces_dict)
-        return [piece for piece in pieces if piece not in self.masked_pieces]
+        """
+        Get a list of the unmasked pieces in the collection. The list is cached
+        until the collection changes so it mustn't be modified
+        """
+        if self._cached_pieces is None:
+            self._cached_pieces = [piece for piece in self.pieces_dict if not piece.masked]
+        return self._cached_pieces
 
     def get_pieces_by_allegiance(self, allegiance):
         """Get the pieces that belong to an allegiance"""
-        return [piece for piece in self.pieces() if piece.allegiance == allegiance]
+        if allegiance not in self._cached_allegiance_pieces:
+            self._cached_allegiance_pieces[allegiance] = [
+                piece for piece in self.pieces() if piece.allegiance == allegiance]
+        return self._cached_allegiance_pieces[allegiance]
+
+    def get_pieces_by_type(self, name, allegiance):
+        """Get the unmasked pieces with a given name and allegiance"""
+        return [piece for piece in self.type_index.get((name, allegiance), ())
+                if not piece.masked]
 
     def add(self, *pieces):
         """Add piece(s) to collection, ensure kings stay last since they are the
@@ -50,16 +119,27 @@ class Pieces():
                 raise TypeError('Pieces container can only contain pieces that '
                                 'inherit the Piece class.')
             self.pieces_dict[piece] = 0
+            piece.owner = self
+            self.type_index.setdefault((str(piece), piece.allegiance), {})[piece] = 0
             if str(piece) == 'king':
                 self.pieces_dict.move_to_end(piece)
+                self.kings.setdefault(piece.allegiance, piece)
             else:
                 self.pieces_dict.move_to_end(piece, last=False)
+        self._clear_cache()
 
     def mask(self, *pieces):
         """Mask pieces in collection"""
         for piece in pieces:
             if self.has(piece):
-                self.masked_pieces.append(piece)
+                piece.masked = True
+        self._clear_cache()
+
+    def unmask(self, *pieces):
+        """Unmask the given pieces or every piece in the collection"""
+        for piece in pieces or self.pieces_dict:
+            piece.masked = False
+        self._clear_cache()
 
     def remove(self, *pieces):
         """Remove piece(s) to collection"""
@@ -67,30 +147,39 @@ class Pieces():
             if self.has(piece):
                 self.lost_pieces.append(piece)
                 del self.pieces_dict[piece]
+                same_type = self.type_index[(str(piece), piece.allegiance)]
+                del same_type[piece]
+                if self.kings.get(piece.allegiance) is piece:
+                    del self.kings[piece.allegiance]
+                    for king in same_type:
+                        self.kings[piece.allegiance] = king
+                        break
+        self._clear_cache()
 
     def has(self, piece):
         """Does the collection have a piece"""
         return piece in self.pieces_dict
 
+    def _get_pawns(self):
+        """Return the unmasked pawns of both allegiances"""
+        return [piece for allegiance in ALLEGIANCES
+                for piece in self.get_pieces_by_type('pawn', allegiance)]
+
     def pawn_needs_promotion(self):
         """Return True if pawn is up for promotion"""
-        for piece in self.pieces():
-            if str(piece) == 'pawn' and piece.up_for_promotion:
-                return True
-        return False
+        return self.get_pawn_promotion_piece() is not None
 
     def reset_promotion(self):
         """Before each move all promotion should have occured"""
-        for piece in self.pieces():
-            if str(piece) == 'pawn':
-                piece.up_for_promotion = False
+        for piece in self._get_pawns():
+            piece.up_for_promotion = False
 
     def get_king(self, allegiance):
         """Return the king piece of a given allegiance"""
-        for piece in self.pieces():
-            if str(piece) == 'king' and piece.allegiance == allegiance:
-                return piece
-        return None
+        king = self.kings.get(allegiance)
+        if king is None or king.masked:
+            return None
+        return king
 
     def get_kings(self):
         """Return the king pieces in a list"""
@@ -99,15 +188,14 @@ class Pieces():
 
     def get_double_move_pawn(self):
         """Returns a pawn if any that has just moved two squares"""
-        for piece in self.pieces():
-            if str(piece) == 'pawn' and piece.enpassant_sq is not None:
-                return piece
-        return None
+        if self.enpassant_sq is None:
+            return None
+        return self._get_piece_if_occupied(_double_move_pawn_idx(self.enpassant_sq))
 
     def get_pawn_promotion_piece(self):
         """Return the pawn piece that needs promoting"""
-        for piece in self.pieces():
-            if str(piece) == 'pawn' and piece.up_for_promotion:
+        for piece in self._get_pawns():
+            if piece.up_for_promotion:
                 return piece
         return None
 
@@ -115,18 +203,12 @@ class Pieces():
         """Return all pieces that are promoted pawns"""
         return [piece for piece in self.pieces() if piece.promoted_piece]
 
-    def reset_enpassant(self):
-        """After each move all enpassant info is reset"""
-        for piece in self.pieces():
-            if str(piece) == 'pawn':
-                piece.reset_enpassant()
-
     def _get_piece_if_occupied(self, idx):
-        """Return a piece by looking for its position index return None if no match"""
-        for piece in self.pieces():
-            if piece.pos_idx == idx:
-                return piece
-        return None
+        """Return the piece on a square as of the last update or None"""
+        piece = self.positions[idx]
+        if piece is None or piece.masked or not self.has(piece):
+            return None
+        return piece
 
     def get_piece_from_properties(self, allegiance, name, move, ambg=None):
         """
@@ -134,13 +216,9 @@ class Pieces():
         one piece matches the properties and ambg doesn't differentiate then an
         error is thrown
         """
-        candidates = []
+        candidates = [piece for piece in self.get_pieces_by_type(NOTATION[name.lower()], allegiance)
+                      if move in piece.legal_moves]
         unique_piece = []
-        for piece in self.pieces():
-            if (piece.get_char().lower() == name.lower() and
-                    piece.allegiance == allegiance and
-                    move in piece.legal_moves):
-                candidates.append(piece)
         if len(candidates) == 1:
             return candidates[0]
         if len(candidates) > 1:
@@ -156,15 +234,13 @@ class Pieces():
 
     def scout_move_pool(self, piece):
         """Return a scout report for a piece"""
-        if str(piece) == 'king':
-            illegal_moves = self.get_king_illegal_moves(piece.allegiance)
-        else:
-            illegal_moves = []
+        is_king = str(piece) == 'king'
+        enemy = OPPOSING_ALLEGIANCE[piece.allegiance]
         report = {}
         move_pool = piece.get_move_pool(pos_idx=True)
         for direction, positions in move_pool.items():
             for position in positions:
-                if position in illegal_moves:
+                if is_king and self.bitboard.is_attacked(position, enemy):
                     continue
                 scouted_piece = self._get_piece_if_occupied(position)
                 if scouted_piece:
@@ -183,32 +259,19 @@ class Pieces():
                                      else [pos_report])
         return report
 
-    def get_king_illegal_moves(self, allegiance):
-        """Return all the illegal moves of the king piece with a given allegiance"""
-        king_illegal_moves = []
-        for piece in self.pieces():
-            if piece.allegiance != allegiance:
-                if str(piece) == 'pawn':
-                    # ignore forward legal moves if its a pawn
-                    king_illegal_moves.extend(
-                        piece.allies_in_legal_moves + piece.illegal_enemy_king_moves)
-                elif str(piece) == 'king':
-                    # king can't move next to its opposite king
-                    enemy_king_move_pool = piece.get_move_pool(pos_idx=True)
-                    enemy_king_move_pool = [item for sublist in enemy_king_move_pool.values()
-                                            for item in sublist]
-                    king_illegal_moves.extend(enemy_king_move_pool)
-                else:
-                    king_illegal_moves.extend(piece.legal_moves +
-                                              piece.allies_in_legal_moves +
-                                              piece.illegal_enemy_king_moves)
-        return list(set(king_illegal_moves))
+    def get_attacked_squares(self, allegiance):
+        """Return the mask of squares attacked or defended by an allegiance"""
+        attacked = 0
+        for piece, mask in self._attack_masks.items():
+            if piece.allegiance == allegiance:
+                attacked |= mask
+        return attacked
 
     def _get_king_attackers(self, king_piece):
         """Get all pieces currently attacking the given king"""
+        candidates = self.attack_map[king_piece.pos_idx]
         attackers = [piece for piece in self.pieces()
-                     if (king_piece.pos_idx in piece.legal_moves and
-                         king_piece.allegiance != piece.allegiance)]
+                     if piece in candidates and king_piece.allegiance != piece.allegiance]
         return attackers
 
     def _update_piece_positions(self, positions):
@@ -216,69 +279,172 @@ class Pieces():
         Update the position of each piece given its index in the board position
         list
         """
-        for piece in self.pieces():
-            piece.pos_idx = positions.index(piece)
-
-    def _update_legal_moves(self):
-        """Update the legal moves of all the pieces"""
-        for piece in self.pieces():
-            piece_scout_report = self.scout_move_pool(piece)
-            piece.update_legal_moves(piece_scout_report)
+        for idx, piece in enumerate(positions):
+            if piece is not None:
+                piece.pos_idx = idx
+
+    def _get_changed_squares(self, positions):
+        """Return the squares whose occupant changed since the last update"""
+        changed = [idx for idx, (piece, last_piece) in enumerate(zip(positions, self.positions))
+                   if piece is not last_piece]
+        self.positions = list(positions)
+        return changed
+
+    def _get_stale_pieces(self, changed, positions):
+        """
+        Return the pieces whose moves depend on a changed square. That is the
+        pieces on the square, the pieces attacking or defending it and the
+        pawns that could push onto it
+        """
+        stale = set(self._enpassant_pawns) | self._restricted_pieces
+        for idx in changed:
+            stale.update(self.attack_map[idx])
+            stale.update(self.defend_map[idx])
+            for pawn_idx in (idx, idx - 16, idx - 8, idx + 8, idx + 16):
+                if 0 <= pawn_idx < 64 and positions[pawn_idx] is not None:
+                    if pawn_idx == idx or str(positions[pawn_idx]) == 'pawn':
+                        stale.add(positions[pawn_idx])
+        return stale
+
+    def _register_attacks(self, piece):
+        """Record the squares attacked and defended by a piece in the maps"""
+        self._unregister_attacks(piece)
+        mask = self.bitboard.attacks(piece.pos_idx, str(piece), piece.allegiance)
+        allies = self.bitboard.occupied[piece.allegiance]
+        for idx in squares(mask & ~allies):
+            self.attack_map[idx].add(piece)
+        for idx in squares(mask & allies):
+            self.defend_map[idx].add(piece)
+        self._attack_masks[piece] = mask
+
+    def _unregister_attacks(self, piece):
+        """Remove a piece from the attack and defend maps"""
+        mask = self._attack_masks.pop(piece, 0)
+        for idx in squares(mask):
+            self.attack_map[idx].discard(piece)
+            self.defend_map[idx].discard(piece)
+
+    def _update_legal_moves(self, changed, positions):
+        """
+        Update the legal moves of the pieces affected by the changed squares.
+        Kings are always updated since their moves depend on every enemy attack
+        """
+        pieces = self.pieces()
+        for piece in set(self._attack_masks).difference(pieces):
+            self._unregister_attacks(piece)
+        stale = self._get_stale_pieces(changed, positions)
+        kings = []
+        for piece in pieces:
+            if str(piece) == 'king':
+                kings.append(piece)
+                self._register_attacks(piece)
+            elif piece in stale or piece not in self._attack_masks:
+                piece.update_legal_moves(self.bitboard)
+                self._register_attacks(piece)
+        for king in kings:
+            king.update_legal_moves(self.bitboard, enemy_attacks=self.get_attacked_squares(
+                OPPOSING_ALLEGIANCE[king.allegiance]))
+
+    def _update_legality(self):
+        """
+        Remove the moves that would leave the own king attacked. The checkers
+        and pins are found once per allegiance and the pieces restricted here
+        are recomputed on the next update
+        """
+        self._restricted_pieces = set()
+        for king in self.get_kings():
+            allegiance = king.allegiance
+            checkers = get_checkers(self.bitboard, allegiance)
+            evasions = get_evasions(self.bitboard, allegiance, checkers)
+            pins = get_pins(self.bitboard, allegiance)
+            if checkers:
+                danger = get_king_danger(self.bitboard, allegiance)
+                king.legal_moves = [move for move in king.legal_moves if not danger >> move & 1]
+            for piece in self.get_pieces_by_allegiance(allegiance):
+                allowed = evasions & pins.get(piece.pos_idx, ALL_SQUARES)
+                if piece in self._enpassant_pawns:
+                    captured_idx = _double_move_pawn_idx(self.enpassant_sq)
+                    piece.legal_moves = [
+                        move for move in piece.legal_moves
+                        if (is_enpassant_legal(self.bitboard, allegiance, piece.pos_idx, move,
+                                               captured_idx)
+                            if move == self.enpassant_sq else allowed >> move & 1)]
+                elif allowed != ALL_SQUARES and piece is not king:
+                    piece.legal_moves = [move for move in piece.legal_moves
+                                         if allowed >> move & 1]
+                else:
+                    continue
+                self._restricted_pieces.add(piece)
 
     def _update_in_check(self):
         """Update the 'in check' and 'checked by' status of the kings"""
         for king in self.get_kings():
-            enemy_attacks = self.get_king_illegal_moves(king.allegiance)
-            king_attackers = self._get_king_attackers(king)
-            king.enemy_attacks = enemy_attacks
-            king.checked_by = king_attackers
-            king.update_check()
-
-    def _update_castling_rights(self):
-        """Update the castling rights of the kings"""
-        for king in self.get_kings():
-            if king.move_cnt > 0:
-                king.king_side_castle_allowed = False
-                king.queen_side_castle_allowed = False
-            else:
-                king_side_piece = self._get_piece_if_occupied(king.king_side_rook_pos)
-                queen_side_piece = self._get_piece_if_occupied(king.queen_side_rook_pos)
-                king.king_side_rook_piece = king_side_piece
-                king.queen_side_rook_piece = queen_side_piece
-                if not (str(king_side_piece) == 'rook' and king_side_piece.move_cnt == 0):
-                    king.king_side_castle_allowed = False
-                if not (str(queen_side_piece) == 'rook' and queen_side_piece.move_cnt == 0):
-                    king.queen_side_castle_allowed = False
+            king.update_check(self.bitboard)
+            king.checked_by = self._get_king_attackers(king) if king.in_check else []
 
     def _update_castling(self, mate=False):
         """Update the validity of castling on each side for each king"""
         for king in self.get_kings():
-            if not king.in_check:
-                cond_ak = all([not self._get_piece_if_occupied(pos)
-                               for pos in king.king_side_empty_squares])
-                cond_aq = all([not self._get_piece_if_occupied(pos)
-                               for pos in king.queen_side_empty_squares])
-
-                enemy_attacks = self.get_king_illegal_moves(king.allegiance)
-                cond_bk = all([pos not in enemy_attacks
-                               for pos in king.king_side_transition])
-                cond_bq = all([pos not in enemy_attacks
-                               for pos in king.queen_side_transition])
-
-                if cond_ak and cond_bk:
-                    king.king_side_castle_valid = True
-                else:
-                    king.disable_castle_move(side='king')
+            self._update_castle_validity(king)
+            if not mate:
+                king.add_castling_legal_moves()
 
-                if cond_aq and cond_bq:
-                    king.queen_side_castle_valid = True
-                else:
-                    king.disable_castle_move(side='queen')
+    def _update_castle_validity(self, king):
+        """Set whether a king can castle on each side, its check status must be current"""
+        if not king.in_check:
+            allegiance = king.allegiance
+            cond_ak = (self.castling >> CASTLING_RIGHTS.index((allegiance, 'king')) & 1 and
+                       all(not self._get_piece_if_occupied(pos)
+                           for pos in king.king_side_empty_squares))
+            cond_aq = (self.castling >> CASTLING_RIGHTS.index((allegiance, 'queen')) & 1 and
+                       all(not self._get_piece_if_occupied(pos)
+                           for pos in king.queen_side_empty_squares))
+
+            enemy = OPPOSING_ALLEGIANCE[king.allegiance]
+            cond_bk = cond_ak and not any(self.bitboard.is_attacked(pos, enemy)
+                                          for pos in king.king_side_transition)
+            cond_bq = cond_aq and not any(self.bitboard.is_attacked(pos, enemy)
+                                          for pos in king.queen_side_transition)
+
+            if cond_ak and cond_bk:
+                king.king_side_castle_valid = True
             else:
-                king.disable_castle_move()
+                king.disable_castle_move(side='king')
 
-            if not mate:
-                king.add_castling_legal_moves()
+            if cond_aq and cond_bq:
+                king.queen_side_castle_valid = True
+            else:
+                king.disable_castle_move(side='queen')
+        else:
+            king.disable_castle_move()
+
+    def compute_legal_moves(self, piece):
+        """
+        Set the legal moves of a single piece straight from the bitboard, along
+        with the squares it defends and, for a king, its check and castling
+        status
+        """
+        # Stamped first so that reading the state set here doesn't recompute it
+        piece._generation = self.generation
+        piece.update_legal_moves(self.bitboard)
+        if str(piece) == 'king':
+            piece.update_check(self.bitboard)
+            piece.checked_by = [
+                self.positions[idx] for idx in squares(self.bitboard.attackers(
+                    piece.pos_idx, OPPOSING_ALLEGIANCE[piece.allegiance]))
+            ] if piece.in_check else []
+            self._update_castle_validity(piece)
+        allegiance = piece.allegiance
+        castling = [side for bit, (right_allegiance, side) in enumerate(CASTLING_RIGHTS)
+                    if self.castling >> bit & 1 and right_allegiance == allegiance]
+        # Only the side to move, the enemy of the pawn that moved two squares,
+        # can take en passant
+        enpassant_sq = self.enpassant_sq
+        if enpassant_sq is not None and (enpassant_sq // 8 == 2) != (allegiance == 'white'):
+            enpassant_sq = None
+        piece.legal_moves = [end_idx for _, end_idx in generate_legal_moves(
+            self.bitboard, allegiance, enpassant_sq=enpassant_sq, castling=castling,
+            from_mask=1 << piece.pos_idx)]
 
     def _update_enpassant(self):
         """This function will check if enpassant is a viable move and enable the
@@ -293,17 +459,38 @@ class Pieces():
                 adjacent_piece = self._get_piece_if_occupied(idx)
                 if (adjacent_piece is not None and str(adjacent_piece) == 'pawn' and
                         adjacent_piece.allegiance != piece.allegiance):
-                    adjacent_piece.enable_enpassant(pos - (8*piece.get_direction()),
-                                                    piece)
-                    adjacent_piece.add_enpassant_move()
+                    adjacent_piece.legal_moves += [self.enpassant_sq]
+                    self._enpassant_pawns.append(adjacent_piece)
 
-    def update(self, positions, mate=False):
-        """Ordered update of piece state"""
+    def update(self, positions, mate=False, bitboard=None, castling=0, enpassant_sq=None):
+        """
+        Ordered update of piece state. Move generation reads from the bitboard,
+        which is built from the positions if one isn't provided. The castling
+        mask and enpassant square are the game state held by the board. Only the
+        pieces affected by the squares that changed since the last update are
+        recomputed
+        """
+        if bitboard is None:
+            bitboard = BitBoard()
+            bitboard.load(positions)
+        self.bitboard = bitboard
+        self.castling = castling
+        self.enpassant_sq = enpassant_sq
+        self.generation += 1
+        if self.lazy:
+            # The attack maps aren't kept, so an eager update starts over
+            self._maps_stale = True
+            self.positions = list(positions)
+            self._update_piece_positions(positions)
+            return
+        if self._maps_stale:
+            self.invalidate()
+        changed = self._get_changed_squares(positions)
         self._update_piece_positions(positions)
-        self._update_legal_moves()
+        self._update_legal_moves(changed, positions)
+        self._enpassant_pawns = []
         if not mate:
             self._update_enpassant()
         self._update_in_check()
-        if not mate:
-            self._update_castling_rights()
         self._update_castling(mate=mate)
+        self._update_legality()
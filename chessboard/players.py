@@ -2,6 +2,11 @@
 
 from settings import DEFAULT_ENGINE
 from uci import UCI
+from chessboard.polyglot import PolyglotBook
+
+# Ways of picking a move from an opening book, at random by weight or the
+# highest weight move
+BOOK_SELECTIONS = ['weighted', 'best']
 
 class Players():
     """Player class"""
@@ -46,9 +51,42 @@ class Human():
 
 
 class Computer(UCI):
-    """Computer Player class"""
+    """
+    Computer Player class. A Polyglot book, given as a path or PolyglotBook, is
+    consulted before the engine. Close the player, or use it as a context
+    manager, to unmap the book and quit the engine
+    """
 
-    def __init__(self, engine=DEFAULT_ENGINE, depth=2, params=None):
+    def __init__(self, engine=DEFAULT_ENGINE, depth=2, params=None, book=None,
+                 book_selection='weighted'):
+        if book_selection not in BOOK_SELECTIONS:
+            raise ValueError('Unknown book selection %r, expected one of %s' %
+                             (book_selection, ', '.join(BOOK_SELECTIONS)))
         super(Computer, self).__init__(engine, depth, params)
         self.is_human = False
         self.allegiance = None
+        self.book = PolyglotBook(book) if isinstance(book, str) else book
+        self.book_selection = book_selection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_book_move(self, board):
+        """Return a 16 bit book move for a board position or None if out of book"""
+        if self.book is None:
+            return None
+        if self.book_selection == 'best':
+            return self.book.find(board)
+        return self.book.choice(board)
+
+    def close(self):
+        """Close the opening book and quit the engine"""
+        if self.book is not None:
+            self.book.close()
+            self.book = None
+        if self.engine.poll() is None:
+            self._write('quit')
+            self.engine.wait()
@@ -0,0 +1,79 @@
+"""
+Immutable snapshot of a board position. A Position holds the bytes of the board
+buffer and the zobrist key, no piece objects or players, so it is cheap to make,
+safe to share between threads and usable as a dict key
+"""
+
+from chessboard import boardbuffer
+
+
+class Position():
+    """Hashable value type for a board position, see Board.position()"""
+
+    __slots__ = ('_buffer', '_key')
+
+    def __init__(self, buffer, key):
+        object.__setattr__(self, '_buffer', bytes(buffer))
+        object.__setattr__(self, '_key', key)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('%s is immutable' % self.__class__.__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError('%s is immutable' % self.__class__.__name__)
+
+    def __hash__(self):
+        return self._key
+
+    def __eq__(self, other):
+        """Positions are equal with the same pieces, side to move, castling and enpassant"""
+        if not isinstance(other, Position):
+            return NotImplemented
+        return (self._key == other._key and
+                self._buffer[:boardbuffer.HALFMOVE] == other._buffer[:boardbuffer.HALFMOVE])
+
+    def __repr__(self):
+        return "<%s(%016x)>" % (self.__class__.__name__, self._key)
+
+    def __reduce__(self):
+        return (self.__class__, (self._buffer, self._key))
+
+    @property
+    def buffer(self):
+        """The board buffer bytes of the position"""
+        return self._buffer
+
+    @property
+    def key(self):
+        """The zobrist key of the position"""
+        return self._key
+
+    @property
+    def allegiance(self):
+        """The allegiance of the side to move"""
+        return 'black' if self._buffer[boardbuffer.SIDE_TO_MOVE] else 'white'
+
+    @property
+    def castling(self):
+        """The castling mask, bit n set for the right CASTLING_RIGHTS[n]"""
+        return self._buffer[boardbuffer.CASTLING]
+
+    @property
+    def enpassant_sq(self):
+        """The square skipped by a pawn that just moved two squares or None"""
+        enpassant_sq = self._buffer[boardbuffer.ENPASSANT]
+        return None if enpassant_sq == boardbuffer.NO_ENPASSANT else enpassant_sq
+
+    @property
+    def halfmove_clk(self):
+        """The halfmove clock, saturating at 255"""
+        return self._buffer[boardbuffer.HALFMOVE]
+
+    @property
+    def fullmove_num(self):
+        """The fullmove number"""
+        return self._buffer[boardbuffer.FULLMOVE] | self._buffer[boardbuffer.FULLMOVE + 1] << 8
+
+    def piece_at(self, idx):
+        """Return the (name, allegiance) of the piece on idx or None"""
+        return boardbuffer.CODE_PIECES.get(self._buffer[idx])
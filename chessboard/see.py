@@ -0,0 +1,64 @@
+"""
+Static exchange evaluation. The captures on one square are resolved on the
+bitboard occupancy alone, least valuable attacker first, so sliders lined up
+behind a capturing piece join in as it leaves the line
+"""
+
+from settings import OPPOSING_ALLEGIANCE, PIECE_VALUES, NOTATION
+
+# Attackers are tried cheapest first
+ATTACKER_ORDER = ['pawn', 'knight', 'bishop', 'rook', 'queen', 'king']
+
+
+def _least_valuable_attacker(bitboard, attackers, allegiance):
+    """Return the square and name of the cheapest piece of an allegiance in attackers"""
+    masks = bitboard.pieces[allegiance]
+    for name in ATTACKER_ORDER:
+        mask = attackers & masks[name]
+        if mask:
+            return (mask & -mask).bit_length() - 1, name
+    return None, None
+
+
+def see(bitboard, start_idx, end_idx, enpassant_sq=None, promotion_choice=None):
+    """
+    Return the material the side moving from start_idx expects to win with the
+    move to end_idx, in centipawns, if both sides keep recapturing on end_idx
+    while it pays. A move to an undefended square scores the captured piece, a
+    move that loses the piece scores negatively
+    """
+    name, allegiance = bitboard.piece_at(start_idx)
+    occupied = bitboard.occupancy()
+    target = bitboard.piece_at(end_idx)
+    if target is not None:
+        gain = [PIECE_VALUES[target[0]]]
+    elif name == 'pawn' and end_idx == enpassant_sq:
+        gain = [PIECE_VALUES['pawn']]
+        occupied &= ~(1 << (end_idx + (8 if allegiance == 'white' else -8)))
+    else:
+        gain = [0]
+    on_square = PIECE_VALUES[name]
+    if promotion_choice is not None:
+        on_square = PIECE_VALUES[NOTATION[promotion_choice.lower()]]
+        gain[0] += on_square - PIECE_VALUES['pawn']
+    occupied &= ~(1 << start_idx)
+
+    side = OPPOSING_ALLEGIANCE[allegiance]
+    while True:
+        attackers = bitboard.attackers(end_idx, side, occupied) & occupied
+        idx, attacker = _least_valuable_attacker(bitboard, attackers, side)
+        if idx is None:
+            break
+        if attacker == 'king' and (bitboard.attackers(end_idx, OPPOSING_ALLEGIANCE[side],
+                                                      occupied) & occupied):
+            # The king can't capture onto a defended square
+            break
+        gain.append(on_square - gain[-1])
+        on_square = PIECE_VALUES[attacker]
+        occupied &= ~(1 << idx)
+        side = OPPOSING_ALLEGIANCE[side]
+
+    # Either side may stop recapturing, so fold the sequence back from the end
+    for depth in range(len(gain) - 1, 0, -1):
+        gain[depth - 1] = -max(-gain[depth - 1], gain[depth])
+    return gain[0]
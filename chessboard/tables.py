@@ -0,0 +1,93 @@
+"""
+Per square move and ray tables, built once at import. Squares are board
+positional indexes (a8 is 0, h1 is 63) and each mask has bit n set for square n
+"""
+
+from settings import KNIGHT_MOVES
+
+# Compass offsets. Rays with a positive offset run towards h1 so the nearest
+# blocker is the lowest set bit, negative rays use the highest set bit
+NORTH, SOUTH, WEST, EAST = -8, 8, -1, 1
+NORTH_WEST, NORTH_EAST, SOUTH_WEST, SOUTH_EAST = -9, -7, 7, 9
+
+ROOK_DIRECTIONS = [NORTH, SOUTH, WEST, EAST]
+BISHOP_DIRECTIONS = [NORTH_WEST, NORTH_EAST, SOUTH_WEST, SOUTH_EAST]
+COMPASS_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+# Piece relative directions keyed by the direction of play (-1 up the board
+# for white, 1 down the board for black)
+RELATIVE_DIRECTIONS = {-1: {'fwd': NORTH, 'bkwd': SOUTH, 'left': WEST, 'right': EAST,
+                            'dgfl': NORTH_WEST, 'dgfr': NORTH_EAST,
+                            'dgbl': SOUTH_WEST, 'dgbr': SOUTH_EAST},
+                       1: {'fwd': SOUTH, 'bkwd': NORTH, 'left': EAST, 'right': WEST,
+                           'dgfl': SOUTH_EAST, 'dgfr': SOUTH_WEST,
+                           'dgbl': NORTH_EAST, 'dgbr': NORTH_WEST}}
+
+
+def _file_distance(idx_a, idx_b):
+    """Return the number of files between two squares"""
+    return abs(idx_a % 8 - idx_b % 8)
+
+
+def _build_ray(idx, direction):
+    """Return the squares from idx (exclusive) to the board edge in a direction"""
+    ray = []
+    current = idx
+    while True:
+        target = current + direction
+        if not 0 <= target < 64 or _file_distance(current, target) > 1:
+            return tuple(ray)
+        ray.append(target)
+        current = target
+
+
+def _build_targets(idx, offsets, max_file_distance):
+    """Return the squares reached from idx by single steps of the given offsets"""
+    return tuple(idx + offset for offset in offsets
+                 if 0 <= idx + offset < 64 and
+                 _file_distance(idx, idx + offset) <= max_file_distance)
+
+
+def _to_mask(indexes):
+    """Return a mask with the bits of the given squares set"""
+    mask = 0
+    for idx in indexes:
+        mask |= 1 << idx
+    return mask
+
+
+RAYS = {direction: [_build_ray(idx, direction) for idx in range(64)]
+        for direction in COMPASS_DIRECTIONS}
+
+RAY_MASKS = {direction: [_to_mask(ray) for ray in rays] for direction, rays in RAYS.items()}
+
+KNIGHT_TARGETS = [_build_targets(idx, KNIGHT_MOVES, 2) for idx in range(64)]
+KNIGHT_ATTACKS = [_to_mask(targets) for targets in KNIGHT_TARGETS]
+
+KING_TARGETS = [_build_targets(idx, COMPASS_DIRECTIONS, 1) for idx in range(64)]
+KING_ATTACKS = [_to_mask(targets) for targets in KING_TARGETS]
+
+PAWN_TARGETS = {'white': [_build_targets(idx, [NORTH_WEST, NORTH_EAST], 1) for idx in range(64)],
+                'black': [_build_targets(idx, [SOUTH_WEST, SOUTH_EAST], 1) for idx in range(64)]}
+PAWN_ATTACKS = {allegiance: [_to_mask(targets) for targets in targets_list]
+                for allegiance, targets_list in PAWN_TARGETS.items()}
+
+PAWN_HOME_RANK_MASK = {'white': 0xff << 48, 'black': 0xff << 8}
+
+
+def _build_between():
+    """Return the masks of the squares strictly between every pair of aligned squares"""
+    between = [[0]*64 for _ in range(64)]
+    for idx in range(64):
+        for direction in COMPASS_DIRECTIONS:
+            mask = 0
+            for target in RAYS[direction][idx]:
+                between[idx][target] = mask
+                mask |= 1 << target
+    return between
+
+
+BETWEEN = _build_between()
+
+# a8 is a light square, as is every square with an even rank plus file sum
+LIGHT_SQUARES = _to_mask(idx for idx in range(64) if (idx // 8 + idx % 8) % 2 == 0)
@@ -0,0 +1,102 @@
+"""
+Fixed size transposition table keyed by zobrist key. Entries live in parallel
+preallocated arrays, two slots to a bucket. The first slot of a bucket keeps
+the deepest entry of the current search and the second is always replaced
+"""
+
+from array import array
+from chessboard.move import NULL_MOVE
+from settings import TRANSPOSITION_TABLE_MB
+
+# Bound of a stored score, BOUND_NONE marks an empty slot
+BOUND_NONE = 0
+BOUND_EXACT = 1
+BOUND_LOWER = 2
+BOUND_UPPER = 3
+
+# Bytes per slot: key, score, move, depth, bound and generation
+ENTRY_SIZE = 8 + 8 + 2 + 2 + 1 + 1
+BUCKET_SLOTS = 2
+
+
+class TranspositionTable():
+    """
+    Transposition table of (depth, bound, score, move) entries within a
+    megabyte budget, with hit, miss and collision counters. Scores are 64 bit
+    so perft node counts can be stored as well
+    """
+
+    def __init__(self, size_mb=TRANSPOSITION_TABLE_MB):
+        buckets = 1
+        while buckets * 2 * BUCKET_SLOTS * ENTRY_SIZE <= size_mb * 1024 * 1024:
+            buckets *= 2
+        self.size_mb = size_mb
+        self.mask = buckets - 1
+        self.slots = buckets * BUCKET_SLOTS
+        self.clear()
+
+    def __len__(self):
+        return self.slots - self.bounds.count(BOUND_NONE)
+
+    def __repr__(self):
+        return "<%s(%dMB, %d/%d slots, %d hits, %d misses, %d collisions)>" % (
+            self.__class__.__name__, self.size_mb, len(self), self.slots, self.hits,
+            self.misses, self.collisions)
+
+    def new_search(self):
+        """Age the entries so the next search may replace them first"""
+        self.generation = (self.generation + 1) & 0xff
+
+    def probe(self, key):
+        """Return the (depth, bound, score, move) entry stored for a key or None"""
+        slot = (key & self.mask) * BUCKET_SLOTS
+        for slot in (slot, slot + 1):
+            if self.keys[slot] == key and self.bounds[slot] != BOUND_NONE:
+                self.hits += 1
+                self.generations[slot] = self.generation
+                return self.depths[slot], self.bounds[slot], self.scores[slot], self.moves[slot]
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, bound, score, move=NULL_MOVE):
+        """
+        Store an entry for a key. The depth preferred slot takes it when it is
+        empty, holds the same key, is from an older search or is no deeper,
+        otherwise the always replace slot does. A stored move is kept when the
+        new entry has none
+        """
+        slot = (key & self.mask) * BUCKET_SLOTS
+        if not (self.keys[slot] == key or self.bounds[slot] == BOUND_NONE or
+                self.generations[slot] != self.generation or depth >= self.depths[slot]):
+            slot += 1
+        if self.keys[slot] == key:
+            if move == NULL_MOVE:
+                move = self.moves[slot]
+        elif self.bounds[slot] != BOUND_NONE:
+            self.collisions += 1
+        self.keys[slot] = key
+        self.depths[slot] = depth
+        self.bounds[slot] = bound
+        self.scores[slot] = score
+        self.moves[slot] = move
+        self.generations[slot] = self.generation
+
+    def hashfull(self):
+        """Return the permille of the first thousand slots used in the current search"""
+        sample = min(1000, self.slots)
+        used = sum(1 for slot in range(sample) if self.bounds[slot] != BOUND_NONE and
+                   self.generations[slot] == self.generation)
+        return used * 1000 // sample
+
+    def clear(self):
+        """Zero every slot, the generation and the counters"""
+        self.keys = array('Q', bytes(8 * self.slots))
+        self.scores = array('q', bytes(8 * self.slots))
+        self.moves = array('H', bytes(2 * self.slots))
+        self.depths = array('h', bytes(2 * self.slots))
+        self.bounds = array('B', bytes(self.slots))
+        self.generations = array('B', bytes(self.slots))
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
@@ -0,0 +1,57 @@
+"""
+Zobrist keys. A position key is the XOR of a random 64 bit number for every
+piece on its square, the side to move, the castling rights mask and the en
+passant file, so making a move only XORs the keys that changed in and out
+"""
+
+import random
+from settings import ALLEGIANCES, NOTATION, CASTLING_RIGHTS
+
+# Fixed seed so the keys, and anything stored by key, are the same every run
+_RANDOM = random.Random(0x5eed)
+
+PIECE_KEYS = {allegiance: {name: [_RANDOM.getrandbits(64) for _ in range(64)]
+                           for name in NOTATION.values()}
+              for allegiance in ALLEGIANCES}
+
+BLACK_TO_MOVE_KEY = _RANDOM.getrandbits(64)
+
+_CASTLING_RIGHT_KEYS = [_RANDOM.getrandbits(64) for _ in CASTLING_RIGHTS]
+
+ENPASSANT_KEYS = [_RANDOM.getrandbits(64) for _ in range(8)]
+
+
+def _build_castling_keys():
+    """Return the key of every castling mask, the XOR of the keys of the rights held"""
+    keys = []
+    for castling in range(1 << len(CASTLING_RIGHTS)):
+        key = 0
+        for bit, right_key in enumerate(_CASTLING_RIGHT_KEYS):
+            if castling >> bit & 1:
+                key ^= right_key
+        keys.append(key)
+    return keys
+
+
+# Indexed by castling mask, bit n set for the right CASTLING_RIGHTS[n]
+CASTLING_KEYS = _build_castling_keys()
+
+
+def castling_key(castling):
+    """Return the key of a castling mask"""
+    return CASTLING_KEYS[castling]
+
+
+def enpassant_key(enpassant_sq):
+    """Return the key of an en passant square or 0 if there is none"""
+    return 0 if enpassant_sq is None else ENPASSANT_KEYS[enpassant_sq % 8]
+
+
+def hash_position(bitboard, allegiance, castling, enpassant_sq):
+    """Compute the key of a position from scratch"""
+    key = 0
+    for idx, name, piece_allegiance in bitboard.iter_pieces():
+        key ^= PIECE_KEYS[piece_allegiance][name][idx]
+    if allegiance == 'black':
+        key ^= BLACK_TO_MOVE_KEY
+    return key ^ CASTLING_KEYS[castling] ^ enpassant_key(enpassant_sq)
@@ -2,14 +2,25 @@
 
 import re
 import utils
+from settings import NOTATION, CASTLING_RIGHTS
+
+PIECE_CHARS = {name: char for char, name in NOTATION.items()}
+
+# FEN castling availability characters in CASTLING_RIGHTS order
+CASTLING_CHARS = [PIECE_CHARS[side].upper() if allegiance == 'white' else PIECE_CHARS[side]
+                  for allegiance, side in CASTLING_RIGHTS]
 
 class FENBuilder():
     """Container that creates a FEN standard string from a provided state"""
-    def __init__(self, pieces, players, halfmove_clk, fullmove_num):
+    def __init__(self, pieces, players, halfmove_clk, fullmove_num, bitboard=None,
+                 castling=0, enpassant_sq=None):
         self.pieces = pieces
         self.players = players
         self.halfmove_clk = halfmove_clk
         self.fullmove_num = fullmove_num
+        self.bitboard = bitboard
+        self.castling = castling
+        self.enpassant_sq = enpassant_sq
 
     def build(self):
         """Construct the FEN string from the board state"""
@@ -22,12 +33,14 @@ class FENBuilder():
 
     def _build_placement(self):
         """Construct the placement part of the FEN string"""
-        piece_list = [(piece.get_char(), piece.pos_idx)
-                      for piece in self.pieces]
-        piece_list = sorted(piece_list, key=lambda piece: piece[1])
         board_list = [' ']*64
-        for piece_name, piece_pos_idx in piece_list:
-            board_list[piece_pos_idx] = piece_name
+        if self.bitboard is not None:
+            for piece_pos_idx, piece_name, allegiance in self.bitboard.iter_pieces():
+                char = PIECE_CHARS[piece_name]
+                board_list[piece_pos_idx] = char.upper() if allegiance == 'white' else char
+        else:
+            for piece in self.pieces:
+                board_list[piece.pos_idx] = piece.get_char()
         for i in range(1, 8):
             board_list.insert((i*9)-1, '/')
         placement = re.sub(r'(\s+)', lambda m: str(len(m.group())), ''.join(board_list))
@@ -35,24 +48,12 @@ class FENBuilder():
 
     def _build_castling_rights(self):
         """Construct the castling availability part of the FEN string"""
-        castling_rights = ''
-        white_king = self.pieces.get_king('white')
-        black_king = self.pieces.get_king('black')
-        if white_king.king_side_castle_allowed:
-            castling_rights += 'K'
-        if white_king.queen_side_castle_allowed:
-            castling_rights += 'Q'
-        if black_king.king_side_castle_allowed:
-            castling_rights += 'k'
-        if black_king.queen_side_castle_allowed:
-            castling_rights += 'q'
-        if not castling_rights:
-            castling_rights = '-'
-        return castling_rights
+        castling_rights = ''.join(char for bit, char in enumerate(CASTLING_CHARS)
+                                  if self.castling >> bit & 1)
+        return castling_rights or '-'
 
     def _build_enpassant_sq(self):
         """Construct the algebraic enpassant square"""
-        double_move_pawn = self.pieces.get_double_move_pawn()
-        if double_move_pawn is None:
+        if self.enpassant_sq is None:
             return '-'
-        return utils.idx_to_algebra(double_move_pawn.enpassant_sq)
+        return utils.idx_to_algebra(self.enpassant_sq)
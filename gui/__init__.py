@@ -56,14 +56,14 @@ def run(board):
             board.do_computer_move()
             reset_gui_pieces(board)
         gf.update_screen(screen, board, legal_moves)
-        # This is here mainly to reduce the lag coming from the check_endgame
+        # This is here mainly to reduce the lag coming from the status check
         if endgame_result is None and not promotion_screen.block:
             pygame.display.update()
         if board.pieces.pawn_needs_promotion():
             promotion_screen.block = True
             promotion_screen.blit(board.players.get_idle_player().allegiance)
         if turn_clock != board.turn_clock:
-            endgame_result = board.check_endgame()
+            endgame_result = board.status()
         if endgame_result is not None:
             endgame_screen.block = True
             endgame_screen.blit(endgame_result,
@@ -73,6 +73,7 @@ def run(board):
 
 def reset_gui_pieces(board):
     """Resets all the gui specific piece information"""
+    gf.GUI_PIECE_STATES.clear()
     for piece in board.pieces:
         gf.init_gui_piece(piece)
 
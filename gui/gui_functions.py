@@ -6,6 +6,30 @@ from gui.gui_settings import (CELL_SIZE, COLOURS, LIGHT_SQUARES, DARK_SQUARES,
                               CASTLING_MOVES, SPECIAL_MOVES, PIECE_IMAGES)
 import utils
 
+
+class GuiPieceState():
+    """Selection and drag state of a piece, kept out of the engine piece objects"""
+
+    def __init__(self):
+        self.selected = False
+        self.dragging = False
+        self.offset_x = None
+        self.offset_y = None
+        self.drag_x = None
+        self.drag_y = None
+
+
+# GuiPieceState of each piece on the board
+GUI_PIECE_STATES = {}
+
+
+def get_gui_state(piece):
+    """Return the gui state of a piece"""
+    if piece not in GUI_PIECE_STATES:
+        GUI_PIECE_STATES[piece] = GuiPieceState()
+    return GUI_PIECE_STATES[piece]
+
+
 def update_screen(screen, board, legal_moves):
     """Draw the board and pieces"""
     draw_board(screen)
@@ -32,7 +56,7 @@ def draw_board(screen):
 def draw_selected_cell(screen, pieces):
     """Draw the currently selected cell"""
     for piece in pieces:
-        if piece.selected:
+        if get_gui_state(piece).selected:
             rect = get_rect(piece.pos_idx)
             draw.rect(screen, COLOURS[SELECTED_PIECE], rect)
 
@@ -63,10 +87,10 @@ def draw_castling_moves(screen, pieces):
     colour = COLOURS[CASTLING_MOVES]
     castle_moves = []
     for piece in pieces:
-        if str(piece) == 'king' and piece.selected:
-            if piece.king_side_castle_allowed and piece.king_side_castle_valid:
+        if str(piece) == 'king' and get_gui_state(piece).selected:
+            if piece.king_side_castle_valid:
                 castle_moves += [piece.king_side_transition[-1]]
-            if piece.queen_side_castle_allowed and piece.queen_side_castle_valid:
+            if piece.queen_side_castle_valid:
                 castle_moves += [piece.queen_side_transition[-1]]
             for castle_move in castle_moves:
                 rect = get_rect(castle_move)
@@ -77,10 +101,10 @@ def draw_enpassant_moves(screen, pieces):
     """Draw the enpassant moves for the currently selected player"""
     colour = COLOURS[ENPASSANT_MOVES]
     for piece in pieces:
-        if str(piece) == 'pawn' and piece.selected:
-            for enpassant_move in piece.enpassant_move:
-                rect = get_rect(enpassant_move)
-                draw.rect(screen, colour, rect, 5)
+        if (str(piece) == 'pawn' and get_gui_state(piece).selected and
+                pieces.enpassant_sq in piece.legal_moves):
+            rect = get_rect(pieces.enpassant_sq)
+            draw.rect(screen, colour, rect, 5)
 
 
 def draw_pieces(screen, pieces):
@@ -88,9 +112,10 @@ def draw_pieces(screen, pieces):
     for piece in pieces:
         piece_surf = PIECE_IMAGES[str(piece)]['cburnett'][piece.allegiance]
         piece_rect = get_rect(piece.pos_idx)
-        if piece.dragging:
-            piece_rect.x = piece.drag_x
-            piece_rect.y = piece.drag_y
+        state = get_gui_state(piece)
+        if state.dragging:
+            piece_rect.x = state.drag_x
+            piece_rect.y = state.drag_y
         screen.blit(piece_surf, piece_rect)
 
 
@@ -122,10 +147,11 @@ def get_idx_from_mouse(mouse_pos):
 def get_closest_idx(piece):
     """Return the positional index of the square closest to dragged piece"""
     closest_idx = None
-    closest_coord_dist = (piece.drag_x)**2 + (piece.drag_y)**2
+    state = get_gui_state(piece)
+    closest_coord_dist = (state.drag_x)**2 + (state.drag_y)**2
     for i in range(64):
         x, y = utils.idx_to_rect(i, multiplier=CELL_SIZE)
-        dist = (piece.drag_x - x)**2 + (piece.drag_y - y)**2
+        dist = (state.drag_x - x)**2 + (state.drag_y - y)**2
         if dist <= closest_coord_dist:
             closest_coord_dist = dist
             closest_idx = i
@@ -144,42 +170,40 @@ def get_clicked_piece(pieces, mouse):
 def get_selected_piece(pieces):
     """Return a piece if it has been selected"""
     for piece in pieces:
-        if piece.selected:
+        if get_gui_state(piece).selected:
             return piece
     return None
 
 def update_pos_mouse(piece, mouse_pos):
     """Update the pieces offsets with a position from a mouse"""
     mouse_x, mouse_y = mouse_pos
-    piece.drag_x = piece.offset_x + mouse_x
-    piece.drag_y = piece.offset_y + mouse_y
+    state = get_gui_state(piece)
+    state.drag_x = state.offset_x + mouse_x
+    state.drag_y = state.offset_y + mouse_y
 
 
 def activate_piece(piece, mouse):
     """Activate a piece in the gui"""
-    piece.selected = True
-    piece.dragging = True
+    state = get_gui_state(piece)
+    state.selected = True
+    state.dragging = True
     x, y = utils.idx_to_rect(piece.pos_idx, multiplier=CELL_SIZE)
-    piece.offset_x = x - mouse[0]
-    piece.offset_y = y - mouse[1]
-    piece.drag_x = x
-    piece.drag_y = y
+    state.offset_x = x - mouse[0]
+    state.offset_y = y - mouse[1]
+    state.drag_x = x
+    state.drag_y = y
 
 
 def deactivate_piece(piece):
     """Initialise piece with gui state"""
-    piece.selected = False
-    piece.dragging = False
+    state = get_gui_state(piece)
+    state.selected = False
+    state.dragging = False
 
 
 def init_gui_piece(piece):
     """Initialise piece with gui state"""
-    setattr(piece, 'selected', False)
-    setattr(piece, 'dragging', False)
-    setattr(piece, 'offset_x', None)
-    setattr(piece, 'offset_y', None)
-    setattr(piece, 'drag_x', None)
-    setattr(piece, 'drag_y', None)
+    GUI_PIECE_STATES[piece] = GuiPieceState()
 
 
 def handle_mouse_event(event, board, legal_moves):
@@ -244,7 +268,7 @@ def handle_mouse_up_event(board, legal_moves):
     """This method defines what happens on a mouse up click"""
     selected_piece = get_selected_piece(board.pieces)
     if selected_piece is not None:
-        selected_piece.dragging = False
+        get_gui_state(selected_piece).dragging = False
         drag_idx = get_closest_idx(selected_piece)
         if selected_piece.pos_idx != drag_idx:
             if drag_idx in legal_moves:
@@ -258,5 +282,5 @@ def handle_mouse_up_event(board, legal_moves):
 def handle_mouse_motion_event(board, mouse):
     """This method defines what happens on mouse motion"""
     for piece in board.pieces:
-        if piece.dragging:
+        if get_gui_state(piece).dragging:
             update_pos_mouse(piece, mouse)
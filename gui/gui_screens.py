@@ -108,7 +108,7 @@ class EndGameScreen(PopUpScreen):
         """Produce the endgame screen message"""
         if result == 'Checkmate':
             return 'Checkmate!\n%s Wins' % allegiance.capitalize()
-        return 'Stalemate!\nThe Game is Drawn'
+        return '%s!\nThe Game is Drawn' % result
 
 
 class MultiLineSurface(Surface):
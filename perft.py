@@ -0,0 +1,146 @@
+"""
+Perft node counts over a set of reference positions. Run as a script to check
+the move generation and report its throughput in nodes per second
+"""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+import chessboard
+from chessboard.transposition import TranspositionTable, BOUND_EXACT
+from settings import FEN_START_STATE
+
+# Reference positions with their node counts from depth 1 upwards
+PERFT_POSITIONS = [
+    (FEN_START_STATE, [20, 400, 8902, 197281, 4865609]),
+    ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603]),
+    ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191, 2812, 43238, 674624]),
+    ('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333]),
+    ('rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', [44, 1486, 62379, 2103487]),
+    ('r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594]),
+]
+
+
+# Subtree node counts by Zobrist key and depth, kept for the life of each
+# worker process so transpositions are only counted once
+_SUBTREE_COUNTS = None
+
+
+def hashed_perft(board, depth, memo=None):
+    """Perft that remembers subtree node counts in a transposition table"""
+    global _SUBTREE_COUNTS
+    if memo is None:
+        if _SUBTREE_COUNTS is None:
+            _SUBTREE_COUNTS = TranspositionTable()
+        memo = _SUBTREE_COUNTS
+    if depth <= 1:
+        return board.perft(depth)
+    entry = memo.probe(board.key)
+    if entry is not None and entry[0] == depth:
+        return entry[2]
+    nodes = 0
+    for move in list(board.generate_legal_moves()):
+        board.push(move)
+        nodes += hashed_perft(board, depth - 1, memo)
+        board.pop()
+    memo.store(board.key, depth, BOUND_EXACT, nodes)
+    return nodes
+
+
+def _perft_task(task):
+    """Count the nodes below a FEN position in a worker process"""
+    fen_str, depth = task
+    return hashed_perft(chessboard.Board(start_state=fen_str), depth)
+
+
+def _split(board, depth, split_depth):
+    """Return the (FEN, depth) subtrees split_depth plies below the board position"""
+    if split_depth == 0 or depth == 0:
+        return [(board.get_FEN(), depth)]
+    tasks = []
+    for move in list(board.generate_legal_moves()):
+        board.push(move)
+        tasks += _split(board, depth - 1, split_depth - 1)
+        board.pop()
+    return tasks
+
+
+def parallel_perft(fen_str, depth, workers=None, split_depth=1):
+    """
+    Perft with the subtrees below the first split_depth plies shared across a
+    process pool. Each worker memoizes its subtree counts by position
+    """
+    board = chessboard.Board(start_state=fen_str)
+    tasks = _split(board, depth, min(split_depth, depth))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(_perft_task, tasks, chunksize=max(1, len(tasks) // 64)))
+
+
+def run(positions, depth, divide=False, workers=None, split_depth=1):
+    """
+    Run perft on each (FEN, expected counts) position and print the node count
+    and speed. Returns False if any count doesn't match its expected value
+    """
+    passed = True
+    total_nodes = total_time = 0
+    for fen_str, expected in positions:
+        board = chessboard.Board(start_state=fen_str)
+        start = time.perf_counter()
+        if workers is not None:
+            nodes = parallel_perft(fen_str, depth, workers=workers or None,
+                                   split_depth=split_depth)
+        elif divide:
+            counts = board.perft_divide(depth)
+            nodes = sum(counts.values())
+            for move, count in sorted(counts.items()):
+                print('%s: %d' % (move, count))
+        else:
+            nodes = board.perft(depth)
+        elapsed = time.perf_counter() - start
+        total_nodes += nodes
+        total_time += elapsed
+        result = ''
+        if 0 < depth <= len(expected):
+            ok = nodes == expected[depth - 1]
+            passed = passed and ok
+            result = 'ok' if ok else 'FAILED, expected %d' % expected[depth - 1]
+        print('%s depth %d: %d nodes in %.2fs (%.0f nps) %s' % (
+            fen_str, depth, nodes, elapsed, nodes / max(elapsed, 1e-9), result))
+    print('Total: %d nodes in %.2fs (%.0f nps)' % (total_nodes, total_time,
+                                                  total_nodes / max(total_time, 1e-9)))
+    return passed
+
+
+def positive_depth(value):
+    """Parse a command line search depth, which must be at least 1"""
+    depth = int(value)
+    if depth < 1:
+        raise argparse.ArgumentTypeError('depth must be at least 1, got %d' % depth)
+    return depth
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Count perft nodes with chess-py')
+    parser.add_argument('depth', type=positive_depth, nargs='?', default=3,
+                        help='search depth')
+    parser.add_argument('--fen', help='run a single position instead of the reference set')
+    parser.add_argument('--divide', action='store_true',
+                        help='print the node count below each root move')
+    parser.add_argument('--workers', type=int, nargs='?', const=0,
+                        help='count in parallel over a process pool, one worker per core '
+                             'unless a number is given')
+    parser.add_argument('--split', type=int, default=1, choices=[1, 2],
+                        help='plies below the root to split into parallel subtrees')
+    args = parser.parse_args()
+    positions = [(args.fen, [])] if args.fen else PERFT_POSITIONS
+    passed = run(positions, args.depth, divide=args.divide, workers=args.workers,
+                 split_depth=args.split)
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
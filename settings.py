@@ -25,6 +25,21 @@ MAX_RANK = {'white': 8, 'black': 1}
 
 ALLEGIANCES = ['white', 'black']
 
+OPPOSING_ALLEGIANCE = {'white': 'black', 'black': 'white'}
+
+# Order in which castling rights are stored, as in the FEN record 'KQkq'
+CASTLING_RIGHTS = [(allegiance, side) for allegiance in ALLEGIANCES for side in ['king', 'queen']]
+
+# Number of positions kept by a legal move cache
+LEGAL_MOVE_CACHE_SIZE = 4096
+
+# Default memory budget of a transposition table in megabytes
+TRANSPOSITION_TABLE_MB = 16
+
+# Material values in centipawns used by the static exchange evaluation
+PIECE_VALUES = {'pawn': 100, 'knight': 300, 'bishop': 300,
+                'rook': 500, 'queen': 900, 'king': 20000}
+
 KNIGHT_MOVES = [-17, -15, -10, -6, 10, 6, 17, 15]
 
 CASTLING_POSITIONS = {'white': {'king_home_square': 60,
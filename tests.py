@@ -1,9 +1,16 @@
 """ChessPlay test suite"""
+import os
+import random
+import subprocess
+import sys
+import tempfile
 import unittest
+from unittest import mock
 from collections.abc import Iterable
 import re
 import chessboard
 import fen
+import perft
 import settings
 import utils
 
@@ -120,6 +127,198 @@ class TestBoard(unittest.TestCase):
         with self.assertRaises(utils.AlgebraicFuncException):
             board.get_piece(board.get_FEN())
 
+    def test_incremental_update(self):
+        """
+        Updating only the pieces affected by a move should leave the board in
+        the same state as a full update
+        """
+        board = chessboard.Board(start_state=VALID_FEN_STRINGS[4])
+        for ply in range(30):
+            candidates = sorted(
+                (piece.pos_idx, move) for piece in board.pieces.get_pieces_by_allegiance(
+                    board.players.current_player.allegiance) for move in piece.legal_moves)
+            if not candidates:
+                break
+            start_idx, end_idx = candidates[(ply*7) % len(candidates)]
+            board.turn(board.get_piece(start_idx), end_idx, promotion_choice='q')
+            incremental = piece_state(board)
+            board.pieces.invalidate()
+            board.update()
+            self.assertEqual(incremental, piece_state(board))
+
+    def test_lazy_legal_moves(self):
+        """A lazy board should compute only the legal moves that are read"""
+        for fen_str in VALID_FEN_STRINGS:
+            board = chessboard.Board(start_state=fen_str)
+            lazy_board = chessboard.Board(start_state=fen_str, lazy=True)
+            for ply in range(12):
+                self.assertEqual(
+                    [(piece.pos_idx, sorted(piece.legal_moves)) for piece in board.pieces],
+                    [(piece.pos_idx, sorted(piece.legal_moves)) for piece in lazy_board.pieces])
+                moves = sorted(board.generate_legal_moves())
+                if not moves:
+                    break
+                start_idx, end_idx, promotion_choice = moves[(ply*5) % len(moves)]
+                board.turn(board.get_piece(start_idx), end_idx, promotion_choice)
+                lazy_board.turn(lazy_board.get_piece(start_idx), end_idx, promotion_choice)
+        board = chessboard.Board(lazy=True)
+        board.move('e4 e5')
+        self.assertCountEqual(board.get_legal_moves('g1'), ['e2', 'f3', 'h3'])
+        self.assertCountEqual(board.get_piece('b1').legal_moves, [40, 42])
+        computed = [piece for piece in board.pieces
+                    if piece._generation == board.pieces.generation]
+        self.assertEqual([utils.idx_to_algebra(piece.pos_idx) for piece in computed], ['b1'])
+
+    def test_lazy_piece_state(self):
+        """A lazy board should compute the king and defence state the same as an eager one"""
+        def king_state(board):
+            return sorted((king.allegiance, king.in_check, king.king_side_castle_valid,
+                           king.queen_side_castle_valid,
+                           sorted(piece.pos_idx for piece in king.checked_by))
+                          for king in board.pieces.get_kings())
+        for fen_str in VALID_FEN_STRINGS:
+            board = chessboard.Board(start_state=fen_str)
+            lazy_board = chessboard.Board(start_state=fen_str, lazy=True)
+            for ply in range(12):
+                self.assertEqual(king_state(board), king_state(lazy_board))
+                self.assertEqual(piece_state(board), piece_state(lazy_board))
+                moves = sorted(board.generate_legal_moves())
+                if not moves:
+                    break
+                start_idx, end_idx, promotion_choice = moves[(ply*7) % len(moves)]
+                board.turn(board.get_piece(start_idx), end_idx, promotion_choice)
+                lazy_board.turn(lazy_board.get_piece(start_idx), end_idx, promotion_choice)
+        board = chessboard.Board(start_state='r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1', lazy=True)
+        king = board.pieces.get_king('white')
+        self.assertTrue(king.king_side_castle_valid and king.queen_side_castle_valid)
+        board.move('Rd1 Rd8')
+        self.assertFalse(board.pieces.get_king('white').in_check)
+        board.move('Rxd8')
+        king = board.pieces.get_king('black')
+        self.assertTrue(king.in_check)
+        self.assertEqual([piece.pos_idx for piece in king.checked_by], [3])
+        self.assertFalse(king.king_side_castle_valid or king.queen_side_castle_valid)
+
+    def test_lazy_to_eager(self):
+        """A board switched from lazy to eager should rebuild its attack maps on the next update"""
+        board = chessboard.Board()
+        # Start eager so there are attack maps to go stale while lazy
+        lazy_board = chessboard.Board()
+        lazy_board.pieces.lazy = True
+        # push() and pop() keep the bitboard, so update() doesn't reload it
+        with mock.patch.object(chessboard.BitBoard, 'load', side_effect=AssertionError):
+            for uci in ['e2e4', 'e7e5', 'g1f3', 'b8c6', 'f1b5']:
+                board.push_uci(uci)
+                lazy_board.push_uci(uci)
+            lazy_board.pieces.lazy = False
+            lazy_board.update()
+        self.assertEqual(piece_state(lazy_board), piece_state(board))
+        for uci in ['g8f6', 'e1g1']:
+            board.push_uci(uci)
+            lazy_board.push_uci(uci)
+        self.assertEqual(piece_state(lazy_board), piece_state(board))
+
+    def test_push_pop(self):
+        """Popping a pushed move should restore the board exactly"""
+        for fen_str in VALID_FEN_STRINGS:
+            board = chessboard.Board(start_state=fen_str)
+            expected = (board.get_FEN(), piece_state(board))
+            moves = [(piece.pos_idx, move, 'q') for piece in board.pieces.get_pieces_by_allegiance(
+                board.players.current_player.allegiance) for move in piece.legal_moves]
+            for move in moves:
+                board.push(move)
+                self.assertEqual(board.move_stack, [move])
+                self.assertEqual(board.pop(), move)
+                board.update()
+                self.assertEqual(expected, (board.get_FEN(), piece_state(board)))
+
+    def test_zobrist_key(self):
+        """The incremental key should match a key computed from scratch"""
+        board = chessboard.Board(start_state=VALID_FEN_STRINGS[4])
+        start_key = board.key
+        for move in list(board.generate_legal_moves()):
+            board.push(move)
+            board.update()
+            self.assertEqual(board.key, chessboard.Board(start_state=board.get_FEN()).key)
+            board.pop()
+            self.assertEqual(board.key, start_key)
+        # Transpositions reach the same key
+        board_a, board_b = chessboard.Board(), chessboard.Board()
+        board_a.move('Nf3 Nf6 Nc3')
+        board_b.move('Nc3 Nf6 Nf3')
+        self.assertEqual(board_a.key, board_b.key)
+        self.assertNotEqual(board_a.key, chessboard.Board().key)
+
+    def test_board_buffer(self):
+        """A board rebuilt from the buffer should have the same FEN and key"""
+        for fen_str in VALID_FEN_STRINGS:
+            board = chessboard.Board(start_state=fen_str)
+            # The board is built from the buffer alone, no FEN is parsed
+            with mock.patch('chessboard.board.FENParser', side_effect=AssertionError):
+                copy = chessboard.Board.from_buffer(board.as_buffer())
+            self.assertEqual(copy.get_FEN(), board.get_FEN())
+            self.assertEqual(copy.key, board.key)
+            self.assertEqual(piece_state(copy), piece_state(board))
+        # The view follows the board without being fetched again
+        board = chessboard.Board()
+        view = board.as_buffer()
+        board.move('e4 d5')
+        self.assertEqual(chessboard.Board.from_buffer(view).get_FEN(), board.get_FEN())
+        board.pop()
+        self.assertEqual(chessboard.Board.from_buffer(view).get_FEN(),
+                         'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1')
+        self.assertTrue(view.readonly)
+        with self.assertRaises(chessboard.boardbuffer.BoardBufferException):
+            chessboard.Board.from_buffer(bytes(10))
+        # The clocks saturate rather than wrap
+        board = chessboard.Board(start_state='4k3/8/8/8/8/8/8/4K3 w - - 300 70000')
+        copy = chessboard.Board.from_buffer(board.as_buffer())
+        self.assertEqual((copy.halfmove_clk, copy.fullmove_num), (255, 65535))
+
+    def test_position(self):
+        """Positions should be immutable values equal across transpositions"""
+        board_a, board_b = chessboard.Board(), chessboard.Board()
+        start = board_a.position()
+        board_a.move('Nf3 Nf6 Nc3')
+        board_b.move('Nc3 Nf6 Nf3')
+        self.assertEqual(board_a.position(), board_b.position())
+        self.assertNotEqual(board_a.position(), start)
+        self.assertEqual(len({board_a.position(), board_b.position(), start}), 2)
+        self.assertEqual(start, chessboard.Board().position())
+        self.assertEqual(board_a.position().allegiance, 'black')
+        self.assertEqual(board_a.position().piece_at(utils.algebra_to_idx('f3')),
+                         ('knight', 'white'))
+        with self.assertRaises(AttributeError):
+            start.key = 0
+        board = chessboard.Board(start_state=VALID_FEN_STRINGS[4])
+        position = board.position()
+        with mock.patch('chessboard.board.FENParser', side_effect=AssertionError), \
+                mock.patch.object(chessboard.Board, 'from_buffer', side_effect=AssertionError):
+            copy = chessboard.Board.from_position(position)
+        self.assertEqual(copy.get_FEN(), board.get_FEN())
+        self.assertEqual(copy.position(), position)
+        self.assertEqual(piece_state(copy), piece_state(board))
+        self.assertEqual(position.castling, 0xf)
+
+    def test_push_special_moves(self):
+        """Castling, en passant and promotion should move every piece involved"""
+        board = chessboard.Board(start_state=VALID_FEN_STRINGS[15])
+        board.push((utils.algebra_to_idx('e1'), utils.algebra_to_idx('g1')))
+        board.update()
+        self.assertEqual(board.get_FEN(), 'r3k2r/1b4bq/8/8/8/8/7B/R4RK1 b kq - 1 1')
+        board = chessboard.Board(start_state=VALID_FEN_STRINGS[12])
+        board.push((utils.algebra_to_idx('c4'), utils.algebra_to_idx('d3')))
+        board.update()
+        self.assertEqual(board.get_FEN(), '8/8/1k6/2b5/8/3p4/5K2/8 w - - 0 2')
+        board = chessboard.Board(start_state=VALID_FEN_STRINGS[19])
+        board.push((utils.algebra_to_idx('b7'), utils.algebra_to_idx('b8')) + ('n',))
+        board.update()
+        self.assertEqual(board.get_FEN(), '1N2k3/8/8/8/8/8/K7/8 b - - 0 1')
+        board.pop()
+        board.update()
+        self.assertEqual(board.get_FEN(), VALID_FEN_STRINGS[19])
+
+
 class TestPieces(unittest.TestCase):
     """Test the Piece container class/Ordered Dict"""
 
@@ -154,6 +353,37 @@ class TestPieces(unittest.TestCase):
         pieces.reset()
         self.assertFalse(bool(pieces.pieces_dict))
 
+    def test_pieces_indexes(self):
+        """Lookups by type, king and square should follow adds, removes and masks"""
+        board = chessboard.Board()
+        pieces = board.pieces
+        self.assertEqual(pieces.get_king('white'), board.get_piece('e1'))
+        self.assertEqual(len(pieces.get_pieces_by_type('pawn', 'black')), 8)
+        self.assertEqual(pieces._get_piece_if_occupied(utils.algebra_to_idx('d8')),
+                         board.get_piece('d8'))
+        knight = board.get_piece('g8')
+        pieces.mask(knight)
+        self.assertNotIn(knight, pieces.pieces())
+        self.assertEqual(len(pieces.get_pieces_by_type('knight', 'black')), 1)
+        pieces.unmask()
+        self.assertIn(knight, pieces.get_pieces_by_allegiance('black'))
+        king = pieces.get_king('black')
+        pieces.remove(king)
+        self.assertIsNone(pieces.get_king('black'))
+        pieces.add(king)
+        self.assertEqual(pieces.get_king('black'), king)
+
+    def test_pieces_have_slots(self):
+        """Pieces keep no instance dict and share their per type data"""
+        board = chessboard.Board()
+        for piece in board.pieces:
+            self.assertFalse(hasattr(piece, '__dict__'))
+        king = board.pieces.get_king('white')
+        self.assertIs(king.king_side_transition,
+                      settings.CASTLING_POSITIONS['white']['king_side_transition'])
+        self.assertEqual(board.get_piece('g8').get_char(), 'n')
+        self.assertEqual(board.get_piece('g1').get_char(), 'N')
+
     def test_pieces_is_a_list(self):
         """Pieces class should act like a list"""
         pieces = chessboard.Pieces()
@@ -173,6 +403,31 @@ class TestPieces(unittest.TestCase):
             pieces.add(non_piece)
 
 
+class TestBitBoard(unittest.TestCase):
+    """Test the bitboard position core"""
+
+    def test_bitboard_matches_positions(self):
+        """Every piece on the board should be set in exactly one piece mask"""
+        for input_str in VALID_FEN_STRINGS:
+            board = chessboard.Board(start_state=input_str)
+            for idx, piece in enumerate(board.positions):
+                if piece is None:
+                    self.assertIsNone(board.bitboard.piece_at(idx))
+                else:
+                    self.assertEqual(board.bitboard.piece_at(idx),
+                                     (str(piece), piece.allegiance))
+
+    def test_sliding_attacks(self):
+        """Sliding attacks should stop at, and include, the first blocker"""
+        bitboard = chessboard.BitBoard()
+        bitboard.add(utils.algebra_to_idx('c5'), 'rook', 'white')
+        bitboard.add(utils.algebra_to_idx('c7'), 'pawn', 'black')
+        bitboard.add(utils.algebra_to_idx('e5'), 'knight', 'white')
+        attacks = bitboard.attacks(utils.algebra_to_idx('c5'), 'rook', 'white')
+        self.assertCountEqual(utils.idx_to_algebra(*chessboard.bitboard.squares(attacks)),
+                              ['c6', 'c7', 'c4', 'c3', 'c2', 'c1', 'b5', 'a5', 'd5', 'e5'])
+
+
 class TestPieceMovePool(unittest.TestCase):
     """
     Test the move pool of both generic and specific pieces in different board
@@ -308,6 +563,15 @@ class TestPieceMovePool(unittest.TestCase):
         self.assertEqual(piece.dgbl(), [])
         self.assertEqual(piece.dgbr(), [])
 
+    def test_move_pool_does_not_wrap(self):
+        """Directional moves selected by distance should not wrap around the board edge"""
+        piece = chessboard.Piece()
+        piece.pos_idx = 1
+        piece.allegiance = 'white'
+        self.assertEqual(piece.dgbl(3), [])
+        self.assertEqual(piece.dgbr(3), ['e5'])
+        self.assertEqual(piece.left(2), [])
+
     def test_king_move_pool(self):
         """
         Place a king in the middle of the board/corner and make sure the
@@ -480,10 +744,8 @@ class TestLegalMoves(unittest.TestCase):
         self.assertCountEqual(board.get_legal_moves('f8'), ['e8', 'd8', 'c8', 'b8'])
         self.assertCountEqual(board.get_legal_moves('f1'), ['e1', 'd1', 'c1', 'b1'])
         board = chessboard.Board(start_state=self.FEN[3])
-        self.assertCountEqual(board.get_legal_moves('a8'), ['g8', 'f8', 'e8', 'd8',
-                                                            'c8', 'b8', 'a7', 'a6',
-                                                            'a5', 'a4', 'a3', 'a2',
-                                                            'a1'])
+        # Black is in check from the h4 bishop and the rook can't block it
+        self.assertCountEqual(board.get_legal_moves('a8'), [])
         self.assertCountEqual(board.get_legal_moves('a1'), ['b1', 'c1', 'd1', 'a8',
                                                             'a7', 'a6', 'a5', 'a4',
                                                             'a3', 'a2'])
@@ -497,9 +759,7 @@ class TestLegalMoves(unittest.TestCase):
         self.assertCountEqual(board.get_legal_moves('e7'), ['e6', 'e8', 'd7', 'd8'])
         self.assertCountEqual(board.get_legal_moves('e2'), ['e1', 'e3', 'd1', 'd2'])
         board = chessboard.Board(start_state=self.FEN[3])
-        self.assertCountEqual(board.get_legal_moves('h7'), ['h6', 'h5', 'h4', 'g6',
-                                                            'f5', 'e4', 'd3', 'c2',
-                                                            'b1', 'g8'])
+        self.assertCountEqual(board.get_legal_moves('h7'), ['h4'])
 
     def test_knight_legal_moves(self):
         """Make sure legal moves are correct for knight in different setups"""
@@ -526,18 +786,468 @@ class TestLegalMoves(unittest.TestCase):
         self.assertCountEqual(board.get_legal_moves('g8'), ['h8'])
         self.assertCountEqual(board.get_legal_moves('g1'), ['h1'])
         board = chessboard.Board(start_state=self.FEN[3])
-        self.assertCountEqual(board.get_legal_moves('e7'), ['d6', 'd7', 'd8', 'e8',
+        self.assertCountEqual(board.get_legal_moves('e7'), ['d6', 'd7', 'e8',
                                                             'f8', 'f7', 'e6'])
 
+    def test_pinned_piece_legal_moves(self):
+        """A pinned piece can only move along the line of the pin"""
+        board = chessboard.Board(start_state='4k3/4r3/8/8/1b6/8/3N4/4K3 w - - 0 1')
+        self.assertCountEqual(board.get_legal_moves('d2'), [])
+        board = chessboard.Board(start_state='4k3/4r3/8/8/8/8/4R3/4K3 w - - 0 1')
+        self.assertCountEqual(board.get_legal_moves('e2'), ['e3', 'e4', 'e5', 'e6', 'e7'])
+
+    def test_check_evasions(self):
+        """In check only the king moves, captures and blocks of the checker are legal"""
+        board = chessboard.Board(start_state=self.FEN[1])
+        # The en passant capture removes the checking pawn
+        self.assertCountEqual(board.get_legal_moves('c4'), ['d3'])
+        board = chessboard.Board(start_state='8/8/8/KPp4r/8/8/8/7k w - c6 0 1')
+        # The en passant capture would expose the king along the rank
+        self.assertCountEqual(board.get_legal_moves('b5'), ['b6'])
+
+    def test_generate_legal_moves(self):
+        """The bitboard generator should agree with the piece legal moves"""
+        for fen_str in VALID_FEN_STRINGS:
+            board = chessboard.Board(start_state=fen_str)
+            allegiance = board.players.current_player.allegiance
+            castling = [side for side in ['king', 'queen']
+                        if board.castling & chessboard.board.CASTLING_BITS[(allegiance, side)]]
+            generated = chessboard.generate_legal_moves(board.bitboard, allegiance,
+                                                        enpassant_sq=board.enpassant_sq,
+                                                        castling=castling)
+            self.assertCountEqual(list(generated), [
+                (piece.pos_idx, move) for piece in board.pieces.get_pieces_by_allegiance(
+                    allegiance) for move in piece.legal_moves])
+
+    def test_iter_legal_moves(self):
+        """Staged moves should be captures and promotions first, then quiet moves"""
+        for fen_str in VALID_FEN_STRINGS:
+            board = chessboard.Board(start_state=fen_str)
+            enemies = board.bitboard.occupied[chessboard.board.OPPOSING_ALLEGIANCE[
+                board.players.current_player.allegiance]]
+            captures = list(board.iter_legal_moves(stage='captures'))
+            quiets = list(board.iter_legal_moves(stage='quiets'))
+            self.assertEqual(list(board.iter_legal_moves()), captures + quiets)
+            self.assertCountEqual(captures + quiets, list(board.generate_legal_moves()))
+            enpassant_sq = board.enpassant_sq
+            for start_idx, end_idx, promotion_choice in captures:
+                self.assertTrue(enemies >> end_idx & 1 or promotion_choice is not None or
+                                end_idx == enpassant_sq)
+            for start_idx, end_idx, promotion_choice in quiets:
+                self.assertFalse(enemies >> end_idx & 1 or promotion_choice is not None)
+        board = chessboard.Board(start_state=VALID_FEN_STRINGS[9])
+        self.assertEqual(next(board.iter_legal_moves()), (45, 28, None))
+        with self.assertRaises(ValueError):
+            next(board.iter_legal_moves(stage='checks'))
+
+    def test_legal_move_cache(self):
+        """Repeated positions should be served from the legal move cache"""
+        cache = chessboard.cache.LegalMoveCache(maxsize=2)
+        board = chessboard.Board(legal_move_cache=cache)
+        moves = board.legal_moves()
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        board.move('e4 e5')
+        board.pop()
+        board.pop()
+        self.assertEqual(board.legal_moves(), moves)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # Boards sharing a cache share positions and the oldest entry is evicted
+        other = chessboard.Board(start_state=board.get_FEN(), legal_move_cache=cache)
+        self.assertCountEqual(other.get_legal_moves('g1'), ['f3', 'h3'])
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        for fen_str in VALID_FEN_STRINGS[1:3]:
+            chessboard.Board(start_state=fen_str, legal_move_cache=cache).legal_moves()
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn(board.key, cache.entries)
+        # Changing the returned array doesn't change the cached moves
+        moves = board.legal_moves()
+        moves.pop()
+        self.assertEqual(len(board.legal_moves()), 20)
+
+    def test_legal_moves_encoding(self):
+        """Encoded legal moves should round trip and carry the special move flags"""
+        board = chessboard.Board(start_state=VALID_FEN_STRINGS[15])
+        moves = board.legal_moves()
+        self.assertEqual(moves.typecode, 'H')
+        self.assertCountEqual([chessboard.move.decode_move(move) for move in moves],
+                              list(board.generate_legal_moves()))
+        castling = [move for move in moves
+                    if chessboard.move.move_flag(move) == chessboard.move.FLAG_CASTLING]
+        self.assertCountEqual([chessboard.move.move_to_uci(move) for move in castling],
+                              ['e1g1', 'e1c1'])
+        self.assertIn(board.encode_move(60, 62), moves)
+        board = chessboard.Board(start_state=VALID_FEN_STRINGS[19])
+        promotion = chessboard.move.uci_to_move('b7b8n')
+        self.assertIn(promotion, board.legal_moves())
+        board.push(promotion)
+        board.update()
+        self.assertEqual(board.get_FEN(), '1N2k3/8/8/8/8/8/K7/8 b - - 0 1')
+        self.assertEqual(board.pop(), promotion)
+        board.update()
+        board.turn(chessboard.move.uci_to_move('b7b8q'))
+        self.assertEqual(board.get_FEN(), '1Q2k3/8/8/8/8/8/K7/8 b - - 0 1')
+
+    def test_is_legal(self):
+        """Legality of UCI, SAN and encoded moves should be answered without raising"""
+        board = chessboard.Board(start_state='r3k2r/pPpp1ppp/8/3Pp3/8/8/8/R3K2R w KQkq e6 0 1')
+        fen = board.get_FEN()
+        for move in ['d5e6', 'dxe6', 'O-O', '0-0-0+', 'b7b8q', 'bxa8=Q', 'b8N', 'Rab1', 'Ra1b1',
+                     chessboard.move.uci_to_move('e1g1')]:
+            self.assertTrue(board.is_legal(move), move)
+        for move in ['d5d7', 'b7b8', 'b8', 'axb8', 'Rb2', 'Kf3', 'e1e2x', 'zz', '', None, 1.5,
+                     -1, 1 << 16]:
+            self.assertFalse(board.is_legal(move), move)
+        self.assertEqual(board.get_FEN(), fen)
+        board = chessboard.Board(start_state='4k3/8/8/8/8/8/3K4/R6R w - - 0 1')
+        self.assertFalse(board.is_legal('Rd1'))
+        self.assertTrue(board.is_legal('Rhd1'))
+        # Surrounding whitespace is rejected, as by push_uci()
+        board = chessboard.Board()
+        for move in ['Nf3\n', 'e2e4\n', ' e4', 'e4 ', 'g1f3\r\n', 'O-O\n']:
+            self.assertFalse(board.is_legal(move), repr(move))
+        for uci in ['e2e4\n', ' e2e4']:
+            self.assertRaises(utils.InvalidMoveException, board.push_uci, uci)
+
+    def test_apply_uci_moves(self):
+        """UCI moves should be made straight from the move list and illegal ones refused"""
+        board = chessboard.Board()
+        moves = board.apply_uci_moves('e2e4 d7d5 e4d5 g8f6 f1b5 c7c6 d5c6 d8d2')
+        self.assertEqual([chessboard.move.move_to_uci(move) for move in moves],
+                         ['e2e4', 'd7d5', 'e4d5', 'g8f6', 'f1b5', 'c7c6', 'd5c6', 'd8d2'])
+        self.assertEqual(board.get_FEN(),
+                         'rnb1kb1r/pp2pppp/2P2n2/1B6/8/8/PPPq1PPP/RNBQK1NR w KQkq - 0 5')
+        self.assertCountEqual(board.get_legal_moves('e1'), ['f1', 'd2'])
+        board.push_uci('b1d2')
+        board.apply_uci_moves(['e8d8', 'c6b7', 'h7h6', 'b7a8q'])
+        self.assertEqual(board.get_FEN(),
+                         'Qnbk1b1r/p3ppp1/5n1p/1B6/8/8/PPPN1PPP/R1BQK1NR b KQ - 0 7')
+        fen = board.get_FEN()
+        for uci in ['d8d7', 'a7a4', 'h8h9', 'f8e7q', 'xx']:
+            self.assertRaises(utils.InvalidMoveException, board.push_uci, uci)
+            self.assertEqual(board.get_FEN(), fen)
+        self.assertRaises(utils.InvalidMoveException, board.apply_uci_moves, ['d8c7', 'a8a1'])
+        self.assertEqual(board.move_stack[-1], chessboard.move.uci_to_move('d8c7'))
+        # An upper case promotion piece is accepted the same as by is_legal()
+        for uci in ['b7b8Q', 'b7b8q']:
+            self.assertTrue(chessboard.Board(start_state=VALID_FEN_STRINGS[19]).is_legal(uci))
+            board = chessboard.Board(start_state=VALID_FEN_STRINGS[19])
+            self.assertEqual(board.push_uci(uci), chessboard.move.uci_to_move('b7b8q'))
+            self.assertEqual(board.get_FEN(), '1Q2k3/8/8/8/8/8/K7/8 b - - 0 1')
+
 
 class TestCheck(unittest.TestCase):
-    pass
+    """Test the square attack queries and check detection"""
+
+    def test_is_attacked(self):
+        """Square attack queries should agree with the attacked squares mask"""
+        for fen_str in VALID_FEN_STRINGS:
+            board = chessboard.Board(start_state=fen_str)
+            for allegiance in settings.ALLEGIANCES:
+                attacked = board.bitboard.attacked_squares(allegiance)
+                for idx in range(64):
+                    self.assertEqual(board.is_attacked(idx, allegiance), bool(attacked >> idx & 1))
+                    self.assertEqual(bool(board.attackers(idx, allegiance)),
+                                     bool(attacked >> idx & 1))
+
+    def test_attackers(self):
+        """The attackers of a square should be every piece bearing on it"""
+        board = chessboard.Board(start_state=VALID_FEN_STRINGS[4])
+        self.assertEqual([utils.idx_to_algebra(idx) for idx in board.attackers('e8', 'white')],
+                         ['e6'])
+        self.assertTrue(board.is_in_check('black'))
+        self.assertEqual(board.get_check_attackers('black'), 'e6')
+        self.assertCountEqual([utils.idx_to_algebra(idx) for idx in board.attackers('c3', 'white')],
+                              ['b2', 'd2'])
+        self.assertTrue(board.is_attacked('d5', 'black'))
+        self.assertFalse(board.is_attacked('h8', 'white'))
+
+
+class TestStaticExchange(unittest.TestCase):
+    """Test the static exchange evaluation of moves"""
+
+    def see(self, fen_str, uci):
+        """Return the static exchange evaluation of a long algebraic move"""
+        board = chessboard.Board(start_state=fen_str)
+        return board.see(chessboard.move.uci_to_move(uci))
+
+    def test_see(self):
+        """Exchanges should be resolved with the cheapest attacker first"""
+        # Undefended pawn
+        self.assertEqual(self.see('1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1', 'e1e5'), 100)
+        # Knight takes a pawn defended by a knight and a bishop
+        self.assertEqual(self.see('1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1',
+                                  'd3e5'), -200)
+        # Quiet move onto a square attacked by a pawn
+        self.assertEqual(self.see(settings.FEN_START_STATE, 'b1c3'), 0)
+        self.assertEqual(self.see('4k3/8/8/3p4/8/2N5/8/4K3 w - - 0 1', 'c3b5'), 0)
+        self.assertEqual(self.see('4k3/8/2p5/8/8/2N5/8/4K3 w - - 0 1', 'c3b5'), -300)
+
+    def test_see_xray(self):
+        """Sliders behind a capturing piece should join the exchange"""
+        # Doubled rooks win the pawn against a single defender
+        self.assertEqual(self.see('3r2k1/3p4/8/8/8/8/3R4/3RK3 w - - 0 1', 'd2d7'), 100)
+        self.assertEqual(self.see('3r2k1/3r4/8/8/8/8/3R4/3QK3 w - - 0 1', 'd2d7'), 500)
+        # The king defends too, so the exchange ends a rook down
+        self.assertEqual(self.see('3rk3/3p4/8/8/8/8/3R4/3RK3 w - - 0 1', 'd2d7'), -400)
+        # The king can't recapture a defended piece
+        self.assertEqual(self.see('4k3/4p3/8/8/8/8/4R3/4R1K1 w - - 0 1', 'e2e7'), 100)
+
+    def test_see_special_moves(self):
+        """En passant and promotions should be valued"""
+        self.assertEqual(self.see(VALID_FEN_STRINGS[12], 'c4d3'), 100)
+        self.assertEqual(self.see(VALID_FEN_STRINGS[19], 'b7b8q'), 800)
+
+
+class TestGameStatus(unittest.TestCase):
+    """Test the game result reported for a position"""
+
+    def test_game_in_progress(self):
+        """Positions with legal moves and enough material are undecided"""
+        for fen_str in VALID_FEN_STRINGS[:10]:
+            board = chessboard.Board(start_state=fen_str)
+            self.assertIsNone(board.status())
+
+    def test_mate(self):
+        """No legal moves is checkmate when in check and stalemate otherwise"""
+        board = chessboard.Board()
+        board.move('f3 e5 g4 Qh4')
+        self.assertEqual(board.status(), 'Checkmate')
+        self.assertEqual(board.check_endgame(), 'Checkmate')
+        board = chessboard.Board(start_state='7k/5Q2/6K1/8/8/8/8/8 b - - 0 1')
+        self.assertEqual(board.status(), 'Stalemate')
+
+    def test_insufficient_material(self):
+        """Kings with a single minor piece or same coloured bishops can't mate"""
+        for fen_str in ['8/8/4k3/8/8/3K4/8/8 w - - 0 1',
+                        '8/8/4k3/8/8/3K4/8/5N2 w - - 0 1',
+                        '8/3b4/4k3/8/8/3K4/8/5B2 w - - 0 1']:
+            board = chessboard.Board(start_state=fen_str)
+            self.assertEqual(board.status(), 'Insufficient material')
+        for fen_str in ['8/2b5/4k3/8/8/3K4/8/5B2 w - - 0 1',
+                        '8/8/4k3/8/8/3K4/8/4NN2 w - - 0 1',
+                        '8/8/4k3/8/8/3K4/3P4/8 w - - 0 1']:
+            board = chessboard.Board(start_state=fen_str)
+            self.assertIsNone(board.status())
+
+    def test_fifty_move_rule(self):
+        """A hundred plies without a capture or pawn move is a draw"""
+        board = chessboard.Board(start_state='4k3/8/8/8/8/8/4P3/R3K3 w - - 99 80')
+        self.assertIsNone(board.status())
+        board.move('Ra2')
+        self.assertEqual(board.status(), 'Fifty-move rule')
+
+    def test_threefold_repetition(self):
+        """The same position three times with the same side to move is a draw"""
+        board = chessboard.Board()
+        board.move('Nf3 Nf6 Ng1 Ng8 Nf3 Nf6 Ng1')
+        self.assertIsNone(board.status())
+        board.move('Ng8')
+        self.assertEqual(board.status(), 'Threefold repetition')
+        board.pop()
+        board.update()
+        self.assertIsNone(board.status())
+
+    def test_is_repetition(self):
+        """Repetitions should only be counted back to the last capture or pawn move"""
+        board = chessboard.Board()
+        self.assertTrue(board.is_repetition(1))
+        self.assertFalse(board.is_repetition(2))
+        board.apply_uci_moves('g1f3 g8f6 f3g1 f6g8')
+        self.assertTrue(board.is_repetition(2))
+        self.assertFalse(board.can_claim_draw())
+        board.apply_uci_moves('e2e4 e7e5 g1f3 g8f6 f3g1 f6g8')
+        self.assertFalse(board.is_repetition(2))
+        board.apply_uci_moves('g1f3 g8f6 f3g1 f6g8')
+        self.assertTrue(board.is_repetition(2))
+        self.assertFalse(board.is_repetition(3))
+        board.apply_uci_moves('g1f3 g8f6 f3g1 f6g8')
+        self.assertTrue(board.is_repetition(3))
+        self.assertTrue(board.can_claim_draw())
+        board = chessboard.Board(start_state='4k3/8/8/8/8/8/4P3/R3K3 w - - 100 80')
+        self.assertTrue(board.can_claim_draw())
 
 
 
 
 
 
+class TestPerft(unittest.TestCase):
+    """Test the legal move tree node counts of the reference positions"""
+
+    def test_perft(self):
+        """Shallow node counts should match the reference counts"""
+        for fen_str, expected in perft.PERFT_POSITIONS:
+            board = chessboard.Board(start_state=fen_str)
+            depth = 3 if expected[2] < 10000 else 2
+            self.assertEqual(board.perft(depth), expected[depth - 1])
+            self.assertEqual(board.get_FEN(), fen_str)
+
+    def test_perft_divide(self):
+        """The divide counts should sum to the perft count for every root move"""
+        board = chessboard.Board()
+        divide = board.perft_divide(2)
+        self.assertEqual(len(divide), 20)
+        self.assertEqual(divide['e2e4'], 20)
+        self.assertEqual(sum(divide.values()), 400)
+
+    def test_run_depth(self):
+        """Only depths from 1 up should be compared with the expected counts or accepted"""
+        fen_str, expected = perft.PERFT_POSITIONS[2]
+        with mock.patch('builtins.print'):
+            self.assertTrue(perft.run([(fen_str, expected)], 0))
+            self.assertTrue(perft.run([(fen_str, [])], 0))
+            self.assertTrue(perft.run([(fen_str, expected)], 1))
+        self.assertEqual(perft.positive_depth('2'), 2)
+        for value in ['0', '-1']:
+            self.assertRaises(perft.argparse.ArgumentTypeError, perft.positive_depth, value)
+
+    def test_hashed_perft(self):
+        """Memoized subtree counts should not change the node count"""
+        fen_str, expected = perft.PERFT_POSITIONS[2]
+        memo = chessboard.transposition.TranspositionTable(1)
+        board = chessboard.Board(start_state=fen_str)
+        self.assertEqual(perft.hashed_perft(board, 3, memo), expected[2])
+        self.assertEqual(perft.hashed_perft(board, 3, memo), expected[2])
+        self.assertEqual(perft.parallel_perft(fen_str, 3, workers=2, split_depth=2), expected[2])
+
+
+class TestTranspositionTable(unittest.TestCase):
+    """Test the fixed size transposition table"""
+
+    def test_probe_store(self):
+        """Stored entries should be found by key and keep their best move"""
+        table = chessboard.transposition.TranspositionTable(1)
+        self.assertLessEqual(table.slots * chessboard.transposition.ENTRY_SIZE, 1024 * 1024)
+        board = chessboard.Board()
+        move = chessboard.move.uci_to_move('e2e4')
+        self.assertIsNone(table.probe(board.key))
+        table.store(board.key, 3, chessboard.transposition.BOUND_LOWER, 35, move)
+        self.assertEqual(table.probe(board.key),
+                         (3, chessboard.transposition.BOUND_LOWER, 35, move))
+        table.store(board.key, 4, chessboard.transposition.BOUND_EXACT, -20)
+        self.assertEqual(table.probe(board.key),
+                         (4, chessboard.transposition.BOUND_EXACT, -20, move))
+        self.assertEqual((table.hits, table.misses, len(table)), (2, 1, 1))
+        table.new_search()
+        table.clear()
+        self.assertIsNone(table.probe(board.key))
+        self.assertEqual(len(table), 0)
+        self.assertEqual((table.generation, table.hits, table.misses), (0, 0, 1))
+        for values in [table.keys, table.scores, table.moves, table.depths, table.bounds,
+                       table.generations]:
+            self.assertFalse(any(values))
+
+    def test_replacement(self):
+        """Deep entries should survive shallower ones until a new search ages them"""
+        table = chessboard.transposition.TranspositionTable(1)
+        keys = [5 + bucket * (table.mask + 1) for bucket in range(3)]
+        bound = chessboard.transposition.BOUND_EXACT
+        table.store(keys[0], 8, bound, 1)
+        table.store(keys[1], 2, bound, 2)
+        table.store(keys[2], 1, bound, 3)
+        self.assertEqual(table.probe(keys[0]), (8, bound, 1, 0))
+        self.assertIsNone(table.probe(keys[1]))
+        self.assertEqual(table.probe(keys[2]), (1, bound, 3, 0))
+        self.assertEqual(table.collisions, 1)
+        self.assertEqual(table.hashfull(), 2)
+        table.new_search()
+        table.store(keys[1], 2, bound, 2)
+        self.assertIsNone(table.probe(keys[0]))
+        self.assertEqual(table.probe(keys[1]), (2, bound, 2, 0))
+        self.assertEqual(table.hashfull(), 1)
+
+
+class TestPolyglot(unittest.TestCase):
+    """Test the Polyglot keys and opening book reader"""
+
+    def test_polyglot_key(self):
+        """Keys should match the reference keys of the Polyglot book format"""
+        for moves, key in [('', 0x463b96181691fc9c),
+                           ('e2e4 d7d5 e4e5 f7f5', 0x22a48b5a8e47ff78),
+                           ('e2e4 d7d5 e4e5 f7f5 e1e2 e8f7', 0x00fdd303c946bdd9),
+                           ('a2a4 b7b5 h2h4 b5b4 c2c4', 0x3c8123ea7b067637),
+                           ('a2a4 b7b5 h2h4 b5b4 c2c4 b4c3 a1a3', 0x5c3f9b829b279560)]:
+            board = chessboard.Board()
+            board.apply_uci_moves(moves)
+            self.assertEqual(chessboard.polyglot.polyglot_key(board), key, moves)
+
+    def test_book(self):
+        """Book moves should be found by key, decoded and chosen by weight"""
+        start = chessboard.Board()
+        castle = chessboard.Board(start_state='4k3/8/8/8/8/8/8/4K2R w K - 0 1')
+        keys = [chessboard.polyglot.polyglot_key(board) for board in [start, castle]]
+        # Raw moves are to square | from square << 6 with a1 as square 0
+        entries = [(keys[0], 28 | 12 << 6, 10), (keys[0], 27 | 11 << 6, 5),
+                   (keys[0], 16 | 8 << 6, 0), (keys[1], 7 | 4 << 6, 1)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = write_book(directory, entries)
+            with chessboard.polyglot.PolyglotBook(path) as book:
+                self.assertEqual(len(book), 4)
+                self.assertCountEqual([(chessboard.move.move_to_uci(move), weight)
+                                       for move, weight in book.find_all(start)],
+                                      [('e2e4', 10), ('d2d4', 5), ('a2a3', 0)])
+                self.assertEqual(book.find(start), chessboard.move.uci_to_move('e2e4'))
+                choices = {chessboard.move.move_to_uci(book.choice(start, random.Random(seed)))
+                           for seed in range(50)}
+                self.assertEqual(choices, {'e2e4', 'd2d4'})
+                self.assertEqual(chessboard.move.move_to_uci(book.find(castle)), 'e1g1')
+                start.push_uci('e2e4')
+                self.assertIsNone(book.find(start))
+            with open(path, 'ab') as book_file:
+                book_file.write(b'\x00')
+            self.assertRaises(chessboard.polyglot.PolyglotException,
+                              chessboard.polyglot.PolyglotBook, path)
+
+    def test_computer_book(self):
+        """A computer player should play its best or a weighted book move before the engine"""
+        key = chessboard.polyglot.polyglot_key(chessboard.Board())
+        with tempfile.TemporaryDirectory() as directory:
+            book_path = write_book(directory, [(key, 28 | 12 << 6, 10), (key, 27 | 11 << 6, 5)])
+            engine_path = os.path.join(directory, 'engine.py')
+            with open(engine_path, 'w') as engine_file:
+                engine_file.write(FAKE_ENGINE % sys.executable)
+            os.chmod(engine_path, 0o755)
+            config_path = os.path.join(directory, 'engine.cfg')
+            with open(config_path, 'w') as config_file:
+                config_file.write('[fake]\npath = %s\n' % engine_path)
+            with mock.patch('uci.ENGINE_CONFIGURATION_FILE', config_path):
+                self.assertRaises(ValueError, chessboard.Computer, engine='fake',
+                                  book=book_path, book_selection='worst')
+                with chessboard.Computer(engine='fake', book=book_path,
+                                         book_selection='best') as computer:
+                    board = chessboard.Board()
+                    board.players = chessboard.Players(computer, chessboard.Human())
+                    board.do_computer_move()
+                    self.assertEqual(
+                        board.get_FEN(),
+                        'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1')
+                    # Out of book the engine is asked for its best move
+                    board = chessboard.Board()
+                    board.players = chessboard.Players(computer, chessboard.Human())
+                    board.apply_uci_moves('e2e4 e7e5')
+                    board.do_computer_move()
+                    self.assertEqual(board.move_stack[-1], chessboard.move.uci_to_move('g1f3'))
+                self.assertIsNone(computer.book)
+                self.assertIsNotNone(computer.engine.poll())
+                with chessboard.Computer(engine='fake', book=book_path) as computer:
+                    board = chessboard.Board()
+                    choices = set()
+                    for seed in range(50):
+                        random.seed(seed)
+                        choices.add(chessboard.move.move_to_uci(computer.get_book_move(board)))
+                    self.assertEqual(choices, {'e2e4', 'd2d4'})
+
+
+class TestUCI(unittest.TestCase):
+    """Test the universal chess interface module"""
+
+    def test_import(self):
+        """The uci module should import on its own, before the chessboard package"""
+        result = subprocess.run([sys.executable, '-c', 'import uci'], capture_output=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
 class TestUtils(unittest.TestCase):
     """Test the common utilities in the Utils class"""
 
@@ -596,6 +1306,11 @@ class TestUtils(unittest.TestCase):
         self.assertFalse(utils.is_pos_idx(utils))
         self.assertFalse(utils.is_pos_idx('63'))
 
+    def test_move_to_long_algebra(self):
+        """Check moves convert to UCI long algebraic notation"""
+        self.assertEqual(utils.move_to_long_algebra(52, 36), 'e2e4')
+        self.assertEqual(utils.move_to_long_algebra(9, 1, 'q'), 'b7b8q')
+
 
 class TestFENParser(unittest.TestCase):
     """Test the validity checking and parsing functions of the FENParser class"""
@@ -661,5 +1376,37 @@ def flatten(list_):
     """Returns a flattened list"""
     return [item for sublist in list_ for item in sublist]
 
+# A UCI engine that always answers g1f3, formatted with the python executable
+FAKE_ENGINE = '''#!%s
+import sys
+for line in sys.stdin:
+    command = line.strip()
+    if command == 'uci':
+        print('uciok')
+    elif command == 'isready':
+        print('readyok')
+    elif command.startswith('go'):
+        print('bestmove g1f3')
+    elif command == 'quit':
+        break
+    sys.stdout.flush()
+'''
+
+
+def write_book(directory, entries):
+    """Write (key, raw_move, weight) entries to a Polyglot book and return its path"""
+    path = os.path.join(directory, 'book.bin')
+    with open(path, 'wb') as book_file:
+        for key, raw_move, weight in sorted(entries):
+            book_file.write(chessboard.polyglot.ENTRY.pack(key, raw_move, weight, 0))
+    return path
+
+
+def piece_state(board):
+    """Returns the move lists of every piece on the board"""
+    return sorted((piece.pos_idx, str(piece), sorted(piece.legal_moves),
+                   sorted(piece.allies_in_legal_moves),
+                   sorted(piece.illegal_enemy_king_moves)) for piece in board.pieces)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,5 @@
 """This module implements the universal chess engine interface"""
+# pylint: disable=import-outside-toplevel
 
 import os
 import re
@@ -53,7 +54,10 @@ class UCI():
         self._wait_for_ok()
 
     def set_position(self, fen=None, moves=None):
-        """Send a board position to the gui"""
+        """
+        Send a board position to the gui, moves are long algebraic strings or
+        16 bit moves
+        """
         if fen is None:
             fen = 'startpos'
         else:
@@ -62,6 +66,9 @@ class UCI():
                 raise UCIException('Invalid FEN string: %s' % fen)
             fen = 'fen %s' % fen
         if moves is not None:
+            # Imported here as the chessboard package imports this module
+            from chessboard.move import move_to_uci
+            moves = [move_to_uci(move) if isinstance(move, int) else move for move in moves]
             for move in moves:
                 if not utils.is_long_algebraic(move):
                     raise UCIException('Invalid long algebraic move: %s' % move)
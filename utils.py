@@ -130,6 +130,10 @@ def long_algebra_to_move(arg):
         r'([abcdefgh][12345678])([abcdefgh][12345678])([qrbnp]?)', arg)
     return match.groups()
 
+def move_to_long_algebra(start_idx, end_idx, promotion_choice=None):
+    """Converts a chessplay move to UCI long algebraic notation"""
+    return _idx_to_algebra(start_idx) + _idx_to_algebra(end_idx) + (promotion_choice or '')
+
 def _algebra_to_idx(alg: str) -> int:
     """Convert algebraic notation to positional index"""
     if not is_algebraic(alg):